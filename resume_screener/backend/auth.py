@@ -1,18 +1,25 @@
 import os
 import logging
-from datetime import datetime, timezone
-import json
-import urllib.request
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
-from jwt.algorithms import RSAAlgorithm
-from sqlalchemy.orm import Session
+from sqlalchemy import case, inspect, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 from database import get_db
-from models import User
+from models import User, CreditReservation
+from utils.jwks import JwksManager
 
 logger = logging.getLogger(__name__)
 
@@ -20,72 +27,228 @@ logger = logging.getLogger(__name__)
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
 CLERK_FRONTEND_API = os.getenv("CLERK_FRONTEND_API", "clerk.your-domain.com") 
 
-# Cache the JWKS to avoid redundant external network calls per request
-JWKS_CACHE = None
+# Explicit JWKS endpoint (e.g. a StubJwksServer in tests); by default the
+# Clerk Backend API is tried first when a secret key is set, then the
+# Frontend API's well-known URL
+JWKS_URL = os.getenv("JWKS_URL")
 
-def get_clerk_jwks():
-    global JWKS_CACHE
-    if JWKS_CACHE is not None:
-        return JWKS_CACHE
 
-    try:
-        # First, try to get JWKS from the secret key (Backend API) if available
-        if CLERK_SECRET_KEY:
-            request = urllib.request.Request(
-                "https://api.clerk.com/v1/jwks",
-                headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"}
-            )
-            with urllib.request.urlopen(request) as response:
-                JWKS_CACHE = json.loads(response.read().decode())
-                return JWKS_CACHE
-    except Exception as e:
-        logger.warning(f"Failed to fetch JWKS via Secret Key: {e}")
+def _jwks_sources() -> list[tuple[str, dict]]:
+    if JWKS_URL:
+        return [(JWKS_URL, {})]
+    sources = []
+    if CLERK_SECRET_KEY:
+        sources.append(("https://api.clerk.com/v1/jwks", {"Authorization": f"Bearer {CLERK_SECRET_KEY}"}))
+    clerk_frontend = CLERK_FRONTEND_API.replace("https://", "").replace("http://", "").rstrip("/")
+    sources.append((f"https://{clerk_frontend}/.well-known/jwks.json", {}))
+    return sources
 
-    # Fallback to Frontend API URL (Frontend API)
-    try:
-        clerk_frontend = CLERK_FRONTEND_API.replace("https://", "").replace("http://", "")
-        # Remove any trailing slash
-        if clerk_frontend.endswith("/"):
-             clerk_frontend = clerk_frontend[:-1]
-
-        url = f"https://{clerk_frontend}/.well-known/jwks.json"
-        
-        with urllib.request.urlopen(url) as response:
-            JWKS_CACHE = json.loads(response.read().decode())
-            return JWKS_CACHE
-    except Exception as e:
-        logger.warning(f"Failed to fetch JWKS via Frontend API: {e}")
 
-    return None
+_jwks_manager: Optional[JwksManager] = None
 
-def verify_clerk_token(token: str) -> Optional[dict]:
-    jwks = get_clerk_jwks()
-    if not jwks:
-        logger.error("Could not fetch Clerk JWKS for token verification")
+
+def get_jwks_manager() -> JwksManager:
+    """Process-wide signing key cache; main.py starts its refresh loop on app startup."""
+    global _jwks_manager
+    if _jwks_manager is None:
+        _jwks_manager = JwksManager(_jwks_sources())
+    return _jwks_manager
+
+
+# ── Verified Token Cache ──────────────────
+# The frontend polls /auth/me and bulk calls reuse one session token, so the
+# same token is verified over and over. Payloads of tokens that passed
+# verification are kept until the token's own `exp`; a token without one
+# is never cached.
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", "10000"))
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token payloads keyed by SHA-256 of the token."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
         return None
 
+    def put(self, token: str, payload: dict):
+        exp = payload.get("exp")
+        if not isinstance(exp, (int, float)):
+            return
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            self._entries[key] = (payload, float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+verified_tokens = VerifiedTokenCache(VERIFIED_TOKEN_CACHE_SIZE)
+
+
+def verify_clerk_token(token: str) -> Optional[dict]:
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
+
     try:
         unverified_header = jwt.get_unverified_header(token)
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                # Convert JWK to PEM format string
-                rsa_key = RSAAlgorithm.from_jwk(json.dumps(key))
-                break
-
-        if rsa_key:
-            payload = jwt.decode(
-                token,
-                key=rsa_key,
-                algorithms=["RS256"],
-                options={"verify_aud": False} # Frontend handles audience
-            )
-            return payload
+        rsa_key = get_jwks_manager().get_key(unverified_header["kid"])
+        if rsa_key is None:
+            logger.error("No Clerk signing key found for token verification")
+            return None
+
+        payload = jwt.decode(
+            token,
+            key=rsa_key,
+            algorithms=["RS256"],
+            options={"verify_aud": False} # Frontend handles audience
+        )
+        verified_tokens.put(token, payload)
+        return payload
     except Exception as e:
         logger.error(f"Token verification failed: {e}")
     return None
 
 
+# ── Identity Cache ────────────────────────
+# /auth/me polling and the bulk endpoints made the clerk_id lookup our
+# hottest query. Users are cached as plain column snapshots for a short TTL
+# and re-attached to the request's session without a SELECT. Paths that
+# change credits or plans invalidate the entry; other processes see the
+# change once it expires.
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "30"))  # seconds
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+
+
+class IdentityCache:
+    """Bounded LRU of clerk_id -> User column values, each kept for `ttl` seconds."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, clerk_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(clerk_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(clerk_id)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[clerk_id]
+            self.misses += 1
+        return None
+
+    def put(self, user: User):
+        snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        with self._lock:
+            self._entries[user.clerk_id] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user.clerk_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, clerk_id: Optional[str]):
+        with self._lock:
+            if self._entries.pop(clerk_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+identity_cache = IdentityCache(IDENTITY_CACHE_TTL, IDENTITY_CACHE_SIZE)
+
+
+def _attach(db: Session, snapshot: dict) -> User:
+    """A persistent User in `db` built from cached column values, without querying."""
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def _upsert_user(db: Session, clerk_id: str, payload: dict) -> User:
+    """
+    Find or create the user for a first-seen clerk_id. Idempotent: two first
+    requests racing each other both end up with the same row.
+    """
+    # Optional: We can pull email from claims if we passed them from the frontend,
+    # but the simplest robust method is just stubbing the DB row.
+    placeholder = f"{clerk_id}@clerk_user.local"
+    email = payload.get("email") or placeholder
+
+    # In case the user signed up *before* clerk integration via old auth,
+    # they might have their email in our DB but no clerk_id. Try linking:
+    if email != placeholder:
+        db.execute(update(User).where(User.email == email).values(clerk_id=clerk_id))
+
+    # Otherwise create a brand new user, unless a concurrent request just did
+    values = dict(
+        clerk_id=clerk_id,
+        email=email,
+        name=payload.get("name") or "New User",
+        password_hash="clerk_oauth_user", # Dummy string to satisfy old SQLite NOT NULL constraint
+        resume_credits=3, # Starter credits
+    )
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        db.execute(insert(User).values(**values).on_conflict_do_nothing())
+        db.commit()
+    else:
+        try:
+            db.add(User(**values))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+
+    user = db.query(User).filter(User.clerk_id == clerk_id).first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Could not create an account for this login",
+        )
+    return user
+
+
 # ── FastAPI Dependency ────────────────────
 security = HTTPBearer()
 
@@ -108,71 +271,133 @@ def get_current_user(
             detail="Token missing subject ID",
         )
 
-    # 1. Try to find by Clerk ID first
+    snapshot = identity_cache.get(clerk_id)
+    if snapshot is not None:
+        return _attach(db, snapshot)
+
+    # 1. Try to find by Clerk ID first, 2. otherwise link or create the account
     user = db.query(User).filter(User.clerk_id == clerk_id).first()
-    
-    # 2. Extract email info if available in token or handle graceful degradation 
-    # (Often email is stored in an 'email' claim, but this isn't guaranteed depending on Clerk config)
-    # So if user not found, we create a stub user.
     if user is None:
-        # Optional: We can pull email from claims if we passed them from the frontend, 
-        # but the simplest robust method is just stubbing the DB row.
-        email = payload.get("email") or f"{clerk_id}@clerk_user.local"
-        
-        # In case the user signed up *before* clerk integration via old auth,
-        # they might have their email in our DB but no clerk_id. Try linking:
-        existing_user_by_email = None
-        if email and email != f"{clerk_id}@clerk_user.local":
-            existing_user_by_email = db.query(User).filter(User.email == email).first()
-
-        if existing_user_by_email:
-            existing_user_by_email.clerk_id = clerk_id
-            db.commit()
-            db.refresh(existing_user_by_email)
-            return existing_user_by_email
-        else:
-            # Create a brand new user
-            new_user = User(
-                clerk_id=clerk_id,
-                email=email,
-                name=payload.get("name") or "New User",
-                password_hash="clerk_oauth_user", # Dummy string to satisfy old SQLite NOT NULL constraint
-                resume_credits=3, # Starter credits
-            )
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
-            return new_user
+        user = _upsert_user(db, clerk_id, payload)
 
+    identity_cache.put(user)
     return user
 
 
-# ── Credit Check ──────────────────────────
-def check_credits(user: User, required: int = 1):
+# ── Credit Ledger ─────────────────────────
+# Credits are reserved before work starts and settled when it ends, each as
+# a conditional UPDATE, so concurrent jobs can't overspend and nothing is
+# read-modify-written. Every reservation is kept as an audit row.
+def _has_active_unlimited(user: User) -> bool:
+    return bool(
+        user.plan_type == "unlimited"
+        and user.plan_expiry
+        and user.plan_expiry.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+    )
+
+
+def reserve_credits(
+    db: Session, user: User, amount: int, reason: str, session_id: Optional[str] = None
+) -> str:
     """
-    Raises 403 if user doesn't have enough credits.
-    Unlimited plan users bypass credit check if plan hasn't expired.
+    Take `amount` credits up front and return the reservation id.
+    Raises 403 if the balance is too low. Unlimited plan users reserve
+    nothing while their plan hasn't expired. `session_id` ties the
+    reservation to the bulk/reverse session it pays for, so it can be
+    refunded if that session's job is lost.
     """
-    if user.plan_type == "unlimited":
-        if user.plan_expiry and user.plan_expiry.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc):
-            return  # Unlimited and not expired
+    user_id, clerk_id = user.id, user.clerk_id
+    if _has_active_unlimited(user):
+        amount = 0
+    else:
+        remaining = db.execute(
+            update(User)
+            .where(User.id == user_id, User.resume_credits >= amount)
+            .values(resume_credits=User.resume_credits - amount)
+            .returning(User.resume_credits)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if remaining is None:
+            db.rollback()
+            balance = db.query(User.resume_credits).filter(User.id == user_id).scalar()
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail={
+                    "message": "Insufficient credits. Please upgrade your plan.",
+                    "credits_remaining": balance or 0,
+                    "required": amount,
+                },
+            )
+
+    reservation_id = str(uuid.uuid4())
+    db.add(CreditReservation(
+        id=reservation_id, user_id=user_id, amount=amount, reason=reason, session_id=session_id,
+    ))
+    db.commit()
+    identity_cache.invalidate(clerk_id)
+    return reservation_id
 
-    if user.resume_credits < required:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail={
-                "message": "Insufficient credits. Please upgrade your plan.",
-                "credits_remaining": user.resume_credits,
-                "required": required,
-            },
-        )
 
+def settle_credits(db: Session, reservation_id: str, used: int) -> Optional[int]:
+    """
+    Charge `used` credits of a reservation (capped at the amount reserved)
+    and refund the rest. Returns the user's remaining credits, or None if
+    the reservation was already settled (e.g. by an earlier run of a retried job).
+    """
+    reservation = db.execute(
+        update(CreditReservation)
+        .where(CreditReservation.id == reservation_id, CreditReservation.status == "reserved")
+        .values(
+            status="committed" if used > 0 else "released",
+            used=case((CreditReservation.amount < used, CreditReservation.amount), else_=max(used, 0)),
+            settled_at=datetime.now(timezone.utc),
+        )
+        .returning(CreditReservation.user_id, CreditReservation.amount, CreditReservation.used)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if reservation is None:
+        db.rollback()
+        return None
 
-def deduct_credits(db: Session, user: User, count: int = 1):
-    """Deduct credits from user account."""
-    if user.plan_type == "unlimited":
-        if user.plan_expiry and user.plan_expiry.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc):
-            return  # Don't deduct for active unlimited plan
-    user.resume_credits = max(0, user.resume_credits - count)
+    refund = reservation.amount - reservation.used
+    user = db.execute(
+        update(User)
+        .where(User.id == reservation.user_id)
+        .values(resume_credits=User.resume_credits + refund)
+        .returning(User.resume_credits, User.clerk_id)
+        .execution_options(synchronize_session=False)
+    ).first()
     db.commit()
-    db.refresh(user)
+    if user is None:
+        return 0
+    identity_cache.invalidate(user.clerk_id)
+    return user.resume_credits
+
+
+def release_credits(db: Session, reservation_id: str) -> Optional[int]:
+    """Refund a whole reservation (the work failed or never ran)."""
+    return settle_credits(db, reservation_id, used=0)
+
+
+def release_session_credits(db: Session, session_id: str) -> int:
+    """Refund every open reservation of a session; returns how many were released."""
+    reservation_ids = [
+        row.id for row in db.query(CreditReservation.id).filter(
+            CreditReservation.session_id == session_id, CreditReservation.status == "reserved",
+        )
+    ]
+    return sum(release_credits(db, reservation_id) is not None for reservation_id in reservation_ids)
+
+
+def release_stale_reservations(db: Session, older_than: float) -> list[Optional[str]]:
+    """
+    Refund reservations still open `older_than` seconds after they were
+    made (their job crashed before settling). Returns the session ids of
+    the ones released here.
+    """
+    # created_at is stored as naive UTC
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=older_than)
+    stale = db.query(CreditReservation.id, CreditReservation.session_id).filter(
+        CreditReservation.status == "reserved", CreditReservation.created_at < cutoff,
+    ).all()
+    return [row.session_id for row in stale if release_credits(db, row.id) is not None]
@@ -0,0 +1,511 @@
+"""
+End-to-end benchmark for ingestion, scoring and SSE delivery.
+
+Builds synthetic resume/JD PDFs and ZIPs, serves the API in-process (uvicorn
+on a loopback port, so SSE frames arrive as they are produced) with the mock
+LLM provider (utils/llm_providers.py), and drives /analyze, /bulk-analyze and
+/reverse-analyze, plus Clerk token verification against a local JWKS stub.
+All state goes to a throwaway directory. Writes a JSON
+report that later runs can be compared against:
+
+    python bench.py --sizes 10,100,1000 --latency lognormal:0.8:0.5 --out bench_results/run.json
+    python bench.py --compare bench_results/base.json bench_results/run.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# ── Synthetic Documents ───────────────────
+
+SKILLS = """
+python java javascript typescript go rust c++ c# sql postgresql mysql mongodb redis kafka spark hadoop
+airflow dbt snowflake aws gcp azure docker kubernetes terraform ansible jenkins linux react angular vue
+node.js django flask fastapi spring graphql rest grpc microservices pandas numpy pytorch tensorflow
+scikit-learn nlp llm tableau powerbi excel figma agile scrum jira git ci/cd selenium cypress
+""".split()
+TITLES = ["Software Engineer", "Data Scientist", "Backend Developer", "DevOps Engineer", "Data Engineer",
+          "Frontend Developer", "ML Engineer", "QA Engineer", "Product Analyst", "Platform Engineer"]
+COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises"]
+
+LINES_PER_PAGE = 48
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(lines: list[str]) -> bytes:
+    """Minimal multi-page PDF with one Helvetica text line per entry."""
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, max(len(lines), 1), LINES_PER_PAGE)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 50 780 Td " + " ".join(
+            f"({_pdf_escape(line)}) '" for line in page_lines
+        ) + " ET"
+        data = stream.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref_at = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at))
+    return out.getvalue()
+
+
+def make_resume(rng: random.Random, index: int) -> bytes:
+    skills = rng.sample(SKILLS, rng.randint(6, 18))
+    lines = [f"Candidate {index}", f"{rng.choice(TITLES)} | candidate{index}@example.com", "", "SKILLS",
+             ", ".join(skills), "", "EXPERIENCE"]
+    for _ in range(rng.randint(2, 5)):
+        lines.append(f"{rng.choice(TITLES)} at {rng.choice(COMPANIES)} ({rng.randint(2010, 2024)})")
+        for _ in range(rng.randint(3, 8)):
+            lines.append(f"- Built {rng.choice(skills)} services using {rng.choice(skills)} and {rng.choice(skills)}")
+    lines += ["", "EDUCATION", f"B.Tech Computer Science, Class of {rng.randint(2005, 2022)}"]
+    return make_pdf(lines)
+
+
+def make_jd(rng: random.Random, index: int) -> str:
+    title = rng.choice(TITLES)
+    required = rng.sample(SKILLS, 8)
+    return "\n".join([
+        f"{title} (Req {index})",
+        f"We are hiring a {title} to join our platform group.",
+        "Required: " + ", ".join(required[:5]),
+        "Nice to have: " + ", ".join(required[5:]),
+        f"At least {rng.randint(1, 8)} years of professional experience.",
+    ])
+
+
+def make_zip(members: list[tuple[str, bytes]]) -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return out.getvalue()
+
+
+# ── Measurement ───────────────────────────
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def pick(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 4)}
+
+
+def _child_peak_rss_mb(pid: int) -> Optional[float]:
+    """A live process's peak RSS from /proc (VmHWM), or None where /proc isn't available."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)  # kB
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb() -> dict:
+    """
+    Peak resident set size so far, for this process and for its largest live
+    child (a parse pool worker). Pool workers are never reaped while the
+    bench runs, so RUSAGE_CHILDREN can't see them; "children" is None where
+    /proc isn't available.
+    """
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KiB on Linux
+    children = [_child_peak_rss_mb(child.pid) for child in multiprocessing.active_children()]
+    children = [peak for peak in children if peak is not None]
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        "children": max(children) if children else None,
+    }
+
+
+async def stream_sse(client, url: str, data: dict, files: list) -> dict:
+    """POST an SSE endpoint and time its events as they arrive."""
+    started = time.perf_counter()
+    first_event = first_result = None
+    arrivals: list[float] = []
+    final: dict = {}
+    async with client.stream("POST", url, data=data, files=files) as response:
+        if response.status_code != 200:
+            body = await response.aread()
+            raise RuntimeError(f"{url} returned {response.status_code}: {body[:300]!r}")
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            now = time.perf_counter() - started
+            event = json.loads(line[5:])
+            if first_event is None:
+                first_event = now
+            if event.get("type") == "result":
+                if first_result is None:
+                    first_result = now
+                arrivals.append(now)
+            elif event.get("type") in ("complete", "error"):
+                final = event
+                break
+    wall = time.perf_counter() - started
+    return {
+        "items": len(arrivals),
+        "wall_s": round(wall, 4),
+        "ttfe_s": round(first_event, 4) if first_event is not None else None,
+        "time_to_first_result_s": round(first_result, 4) if first_result is not None else None,
+        "items_per_s": round(len(arrivals) / wall, 2) if wall else None,
+        # Time between consecutive results reaching the client (steady-state
+        # per-item latency, independent of batch size and time to first result)
+        "item_gap_s": percentiles([b - a for a, b in zip(arrivals, arrivals[1:])]),
+        "final_event": final.get("type"),
+    }
+
+
+# ── Scenarios ─────────────────────────────
+
+async def bench_parse(resumes: list[tuple[str, bytes]]) -> dict:
+    from utils.parser import aextract_text_from_pdf
+
+    started = time.perf_counter()
+    texts = await asyncio.gather(*(aextract_text_from_pdf(data) for _, data in resumes))
+    wall = time.perf_counter() - started
+    total_bytes = sum(len(data) for _, data in resumes)
+    return {
+        "files": len(resumes),
+        "extracted": sum(1 for t in texts if t),
+        "wall_s": round(wall, 4),
+        "files_per_s": round(len(resumes) / wall, 2),
+        "mb_per_s": round(total_bytes / wall / 1e6, 3),
+    }
+
+
+async def bench_analyze(client, resumes, jd: str, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(name: str, data: bytes):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/analyze",
+                data={"job_description": jd, "bypass_cache": "true"},
+                files=[("resume", (name, data, "application/pdf"))],
+            )
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*resumes[i % len(resumes)]) for i in range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "requests_per_s": round(requests / wall, 2),
+        "latency_s": percentiles(latencies),
+    }
+
+
+# ── Auth ──────────────────────────────────
+AUTH_KID = "bench-key"
+
+
+def make_signing_key():
+    """A throwaway RSA key and the JWKS that publishes it (served by a StubJwksServer)."""
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jwt.algorithms import RSAAlgorithm
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = RSAAlgorithm.to_jwk(key.public_key(), as_dict=True)
+    return key, {"keys": [{**jwk, "kid": AUTH_KID, "alg": "RS256", "use": "sig"}]}
+
+
+def bench_auth(signing_key, calls: int) -> dict:
+    """
+    Token verification cost: distinct tokens take the full RS256 path, one
+    token presented repeatedly (/auth/me polling) hits the verified-token cache.
+    """
+    import jwt
+    from auth import verify_clerk_token
+
+    exp = int(time.time()) + 3600
+    tokens = [
+        jwt.encode({"sub": "bench", "exp": exp, "jti": str(i)}, signing_key, algorithm="RS256", headers={"kid": AUTH_KID})
+        for i in range(calls)
+    ]
+
+    def run(batch: list[str]) -> dict:
+        latencies, failures = [], 0
+        started = time.perf_counter()
+        for token in batch:
+            call_started = time.perf_counter()
+            failures += verify_clerk_token(token) is None
+            latencies.append((time.perf_counter() - call_started) * 1e6)
+        wall = time.perf_counter() - started
+        return {"per_s": round(len(batch) / wall, 1), "failures": failures, "latency_us": percentiles(latencies)}
+
+    return {"calls": calls, "verify": run(tokens), "cached": run([tokens[0]] * calls)}
+
+
+async def run_benchmarks(args, signing_key) -> dict:
+    import httpx
+    import uvicorn
+
+    import main
+    from auth import get_current_user
+    from database import SessionLocal
+    from models import User
+
+    # A throwaway unlimited-plan user; auth is bypassed entirely
+    db = SessionLocal()
+    user = User(email="bench@example.com", name="Benchmark", plan_type="unlimited",
+                plan_expiry=datetime.now(timezone.utc) + timedelta(days=1), resume_credits=0)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    main.app.dependency_overrides[get_current_user] = lambda: user
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    rng = random.Random(args.seed)
+    max_size = max(args.sizes)
+    print(f"Generating {max_size} resumes and JDs...", flush=True)
+    resumes = [(f"resume_{i:05d}.pdf", make_resume(rng, i)) for i in range(max_size)]
+    jds = [(f"jd_{i:05d}.pdf", make_pdf(make_jd(rng, i).splitlines())) for i in range(max_size)]
+    jd_text = make_jd(rng, 0)
+
+    report = {"parse": [], "analyze": None, "bulk": [], "reverse": [], "auth": None}
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+        try:
+            print(f"[auth] {args.auth_calls} token verifications", flush=True)
+            report["auth"] = bench_auth(signing_key, args.auth_calls)
+
+            for size in args.sizes:
+                print(f"[parse] {size} PDFs", flush=True)
+                report["parse"].append({"size": size, **await bench_parse(resumes[:size]), "peak_rss_mb": peak_rss_mb()})
+
+            print(f"[analyze] {args.analyze_requests} requests", flush=True)
+            report["analyze"] = {
+                **await bench_analyze(client, resumes, jd_text, args.analyze_requests, args.analyze_concurrency),
+                "peak_rss_mb": peak_rss_mb(),
+            }
+
+            for size in args.sizes:
+                uploads = []
+                if size <= args.max_loose:
+                    uploads.append(("pdfs", [("resumes", (n, d, "application/pdf")) for n, d in resumes[:size]]))
+                uploads.append(("zip", [("resumes", ("resumes.zip", make_zip(resumes[:size]), "application/zip"))]))
+                for upload_kind, files in uploads:
+                    print(f"[bulk-analyze] {size} resumes ({upload_kind})", flush=True)
+                    result = await stream_sse(
+                        client, "/bulk-analyze",
+                        {"job_description": jd_text, "bypass_cache": "true", "batch_mode": str(args.batch).lower()},
+                        files,
+                    )
+                    report["bulk"].append({"size": size, "upload": upload_kind, **result, "peak_rss_mb": peak_rss_mb()})
+
+                print(f"[reverse-analyze] 1 resume vs {size} JDs (zip)", flush=True)
+                result = await stream_sse(
+                    client, "/reverse-analyze",
+                    {"bypass_cache": "true"},
+                    [("resume", resumes[0] + ("application/pdf",)),
+                     ("job_descriptions", ("jds.zip", make_zip(jds[:size]), "application/zip"))],
+                )
+                report["reverse"].append({"size": size, "upload": "zip", **result, "peak_rss_mb": peak_rss_mb()})
+        finally:
+            server.should_exit = True
+            await server_task
+    return report
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+# ── Comparison ────────────────────────────
+# (section, metric path, True if higher is better)
+COMPARED_METRICS = [
+    ("parse", "files_per_s", True),
+    ("bulk", "wall_s", False),
+    ("bulk", "ttfe_s", False),
+    ("bulk", "time_to_first_result_s", False),
+    ("bulk", "item_gap_s.p95", False),
+    ("reverse", "wall_s", False),
+    ("reverse", "ttfe_s", False),
+    ("analyze", "latency_s.p95", False),
+    ("analyze", "requests_per_s", True),
+    ("auth", "verify.per_s", True),
+    ("auth", "cached.per_s", True),
+    ("auth", "cached.latency_us.p95", False),
+]
+
+
+def _metric(row: dict, path: str):
+    for part in path.split("."):
+        row = row.get(part) if isinstance(row, dict) else None
+    return row
+
+
+def _rows(report: dict, section: str) -> dict:
+    rows = report["results"].get(section)
+    if isinstance(rows, dict):
+        return {"": rows}
+    return {f"{r['size']}/{r.get('upload', '')}": r for r in rows or []}
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> int:
+    """Print metric deltas; returns the number of regressions beyond `tolerance`."""
+    regressions = 0
+    for section, path, higher_is_better in COMPARED_METRICS:
+        base_rows, cur_rows = _rows(baseline, section), _rows(current, section)
+        for key in sorted(base_rows.keys() & cur_rows.keys()):
+            before, after = _metric(base_rows[key], path), _metric(cur_rows[key], path)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            regressions += bool(flag)
+            print(f"{section:8} {key:12} {path:28} {before:>10} -> {after:>10} ({change:+.1%}) {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, scoring and SSE delivery against a mock LLM.")
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated batch sizes (max 5000)")
+    parser.add_argument("--latency", default="lognormal:0.8:0.5", help="mock LLM latency distribution (see MOCK_LLM_LATENCY)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock LLM network error rate")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="mock LLM 429 rate")
+    parser.add_argument("--batch", action="store_true", help="score bulk uploads in batched LLM calls")
+    parser.add_argument("--analyze-requests", type=int, default=50)
+    parser.add_argument("--analyze-concurrency", type=int, default=10)
+    parser.add_argument("--auth-calls", type=int, default=2000, help="token verifications per auth scenario")
+    parser.add_argument("--max-loose", type=int, default=100, help="largest size also uploaded as loose PDFs")
+    parser.add_argument("--timeout", type=float, default=3600, help="per-request timeout (seconds)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", default=None, help="JSON report path (default bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two reports and exit")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.tolerance) else 0)
+
+    args.sizes = sorted(int(s) for s in args.sizes.split(","))
+    if args.sizes[-1] > 5000:
+        parser.error("sizes above 5000 exceed ZIP_MAX_MEMBERS")
+
+    # Isolate all state and route scoring to the mock provider; must happen
+    # before the app (and the modules reading these settings) is imported
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "SCORE_CACHE_PATH": os.path.join(workdir, "score_cache.db"),
+        # A text cache left over from an earlier run would turn the parse
+        # scenario into a cache-hit benchmark
+        "TEXT_CACHE_PATH": os.path.join(workdir, "text_cache.db"),
+        "RESULTS_STORE_PATH": os.path.join(workdir, "results_store.db"),
+        "SESSION_LOG_PATH": os.path.join(workdir, "session_log.db"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "job_queue.db"),
+        "JOB_SPOOL_DIR": os.path.join(workdir, "job_spool"),
+        "LLM_PROVIDER": "mock",
+        "LLM_PLAN_PROVIDERS": "",
+        "CONTEXT_CACHE_PROVIDER": "off",
+        "MOCK_LLM_LATENCY": args.latency,
+        "MOCK_LLM_ERROR_RATE": str(args.error_rate),
+        "MOCK_LLM_THROTTLE_RATE": str(args.throttle_rate),
+        "MOCK_LLM_SEED": str(args.seed),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    # Startup loads signing keys from here instead of Clerk
+    from utils.jwks import StubJwksServer
+
+    signing_key, jwks = make_signing_key()
+    started = time.time()
+    try:
+        with StubJwksServer(jwks) as jwks_server:
+            os.environ["JWKS_URL"] = jwks_server.url
+            results = asyncio.run(run_benchmarks(args, signing_key))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "duration_s": round(time.time() - started, 1),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k != "compare"},
+        },
+        "results": results,
+    }
+
+    out = args.out or os.path.join("bench_results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {out}")
+
+
+if __name__ == "__main__":
+    main()
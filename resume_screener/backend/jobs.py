@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+import os
+import zipfile
+from collections import defaultdict
+from typing import AsyncGenerator, Optional, Union
+
+from database import session_scope
+from auth import settle_credits, release_credits, release_session_credits, release_stale_reservations
+from utils.parser import EMPTY_PDF_MESSAGE, aextract_text_from_pdf, aiter_pdfs_from_zip
+from utils.llm_logic import bulk_score_resumes, BATCH_MAX_SIZE
+from utils.prescreen import prescreen
+from utils.dedup import Deduplicator
+from utils.results_store import get_results_store
+from utils.rate_limiter import limiter_key
+from utils.llm_providers import llm_provider
+from utils.compaction import resume_token_budget
+from utils.session_log import SESSION_LOG_TTL, get_session_log
+
+# ── Config ────────────────────────────────
+# A reservation still open this long after it was made belongs to a job
+# that crashed without settling it
+CREDIT_RESERVATION_TTL = float(os.getenv("CREDIT_RESERVATION_TTL", str(SESSION_LOG_TTL)))  # seconds
+STALE_RESERVATION_MESSAGE = "The job did not finish in time. Reserved credits are refunded."
+
+
+def remove_files(paths: list[str]):
+    """Delete spooled upload files, ignoring ones already gone."""
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+async def run_bulk_job(
+    session_id: str,
+    user_id: int,
+    job_description: str,
+    pdf_uploads: list[tuple[str, Union[bytes, str]]],
+    zip_paths: list[str],
+    estimated_total: int,
+    bypass_cache: bool = False,
+    batch_mode: bool = False,
+    prescreen_top_k: Optional[int] = None,
+    prescreen_threshold: Optional[float] = None,
+    provider: Optional[str] = None,
+    token_budget: Optional[int] = None,
+    dedup: bool = True,
+    dedup_near: bool = False,
+    reservation_id: Optional[str] = None,
+) -> AsyncGenerator[dict, None]:
+    """
+    Parse, score and settle one bulk screening batch, yielding SSE event dicts.
+    `pdf_uploads` holds (filename, raw bytes or spooled file path); spooled
+    files are deleted when the job ends. Runs the same way inside a web
+    worker (/bulk-analyze) or a queue worker (worker.py). `provider` is
+    the LLM provider and `token_budget` the resume token budget resolved
+    when the job was submitted. With `dedup`, repeated resumes are scored
+    once and the result is copied to the copies (`dedup_near` also catches
+    near-identical ones). `reservation_id` holds the credits reserved at
+    submission; the job settles it, or releases it if the job dies.
+    """
+    # Share LLM capacity fairly between users (see utils/rate_limiter)
+    limiter_key.set((f"user:{user_id}", session_id))
+    if provider:
+        llm_provider.set(provider)
+    if token_budget:
+        resume_token_budget.set(token_budget)
+    spooled = zip_paths + [content for _, content in pdf_uploads if isinstance(content, str)]
+    settled = False
+    try:
+        async for event in _bulk_job_events(
+            session_id, user_id, job_description, pdf_uploads, zip_paths, estimated_total,
+            bypass_cache, batch_mode, prescreen_top_k, prescreen_threshold,
+            Deduplicator(near=dedup_near) if dedup else None, reservation_id,
+        ):
+            settled = settled or event.get("type") == "complete"
+            yield event
+    except BaseException:
+        if reservation_id and not settled:
+            with session_scope() as db:
+                release_credits(db, reservation_id)
+        raise
+    finally:
+        remove_files(spooled)
+
+
+async def _bulk_job_events(
+    session_id, user_id, job_description, pdf_uploads, zip_paths, estimated_total,
+    bypass_cache, batch_mode, prescreen_top_k, prescreen_threshold, deduplicator, reservation_id,
+):
+    parse_progress = {"parsed": 0, "done": False}
+    # Representative filename -> filenames of its copies waiting for its result
+    pending_copies: dict[str, list[str]] = defaultdict(list)
+    rep_results: dict[str, dict] = {}
+    scored_names: set[str] = set()
+
+    def unique_name(fname: str) -> str:
+        """
+        Results are matched back to their copies by filename, so a scored
+        resume whose name is taken (e.g. a/resume.pdf and b/resume.pdf in a
+        ZIP) is numbered like a file manager would: "resume (2).pdf".
+        """
+        if deduplicator is None or fname not in scored_names:
+            return fname
+        stem, dot, ext = fname.rpartition(".")
+        n = 2
+        while True:
+            candidate = f"{stem} ({n}).{ext}" if dot else f"{fname} ({n})"
+            if candidate not in scored_names:
+                return candidate
+            n += 1
+
+    def is_copy(fname: str, text: Optional[str] = None, byte_digest: Optional[str] = None) -> bool:
+        """
+        Check a resume against the job's deduplicator, queueing it if it's a
+        copy. `fname` is the unique name it will be scored under otherwise.
+        """
+        if deduplicator is None:
+            return False
+        if text is None:
+            rep = deduplicator.match_bytes(byte_digest)
+        else:
+            rep = deduplicator.check(fname, text, byte_digest)
+        if rep is None:
+            if text is not None:
+                scored_names.add(fname)
+            return False
+        parse_progress["parsed"] += 1
+        pending_copies[rep].append(fname)
+        return True
+
+    # Resumes that couldn't be parsed, streamed as error rows between results
+    parse_failures: list[dict] = []
+
+    def parse_failed(fname: str, error: str):
+        parse_progress["parsed"] += 1
+        parse_failures.append(_parse_error_row(fname, error))
+
+    async def iter_resume_pairs():
+        for fname, content in pdf_uploads:
+            try:
+                if isinstance(content, str):
+                    content = await asyncio.to_thread(_read_file, content)
+                # Byte-identical copies skip parsing altogether
+                byte_digest = hashlib.sha256(content).hexdigest() if deduplicator else None
+                if byte_digest and is_copy(unique_name(fname), byte_digest=byte_digest):
+                    continue
+                text = await aextract_text_from_pdf(content)
+            except Exception as e:
+                parse_failed(fname, str(e) or type(e).__name__)
+                continue
+            if not text:
+                parse_failed(fname, EMPTY_PDF_MESSAGE)
+                continue
+            fname = unique_name(fname)
+            if not is_copy(fname, text, byte_digest):
+                parse_progress["parsed"] += 1
+                yield (fname, text)
+        for zip_path in zip_paths:
+            try:
+                async for fname, text, error in aiter_pdfs_from_zip(zip_path):
+                    if error is not None:
+                        parse_failed(fname, error)
+                        continue
+                    fname = unique_name(fname)
+                    if not is_copy(fname, text):
+                        parse_progress["parsed"] += 1
+                        yield (fname, text)
+            except (zipfile.BadZipFile, ValueError):
+                continue
+        parse_progress["done"] = True
+
+    def copies_ready(result: Optional[dict] = None) -> list[dict]:
+        """Record a scored result, and return a copy of it for every duplicate whose representative is done."""
+        if deduplicator is None:
+            return []
+        if result is not None:
+            rep_results[result["filename"]] = result
+        ready = []
+        for rep in [r for r in pending_copies if r in rep_results]:
+            for fname in pending_copies.pop(rep):
+                ready.append({**rep_results[rep], "filename": fname, "duplicate_of": rep})
+        return ready
+
+    results = []
+    processed = 0
+    copies = 0
+    errors = 0
+    total = estimated_total
+    total_final = False
+
+    def numbered(result: dict) -> dict:
+        nonlocal processed
+        processed += 1
+        result["index"] = processed
+        result["total"] = total
+        result["type"] = "result"
+        results.append(result)
+        return result
+
+    def failures_ready() -> list[dict]:
+        nonlocal errors
+        ready = [numbered(row) for row in parse_failures]
+        errors += len(ready)
+        parse_failures.clear()
+        return ready
+
+    # Send initial metadata (total is refined once parsing finishes)
+    yield {'type': 'start', 'total': total, 'estimated': True, 'session_id': session_id}
+
+    # Optional local pre-screen: rank everything first, stream the
+    # filtered-out resumes immediately and only AI-score the rest
+    scoring_source = iter_resume_pairs()
+    prescreened = 0
+    if prescreen_top_k is not None or prescreen_threshold is not None:
+        all_pairs = [pair async for pair in scoring_source]
+        scoring_source, filtered = await asyncio.to_thread(
+            prescreen, all_pairs, job_description, prescreen_top_k, prescreen_threshold
+        )
+        total = parse_progress["parsed"]  # includes duplicates held back from pre-screening
+        total_final = True
+        yield {'type': 'total', 'total': total, 'estimated': False}
+
+        for row in failures_ready():
+            yield row
+        for result in filtered:
+            prescreened += 1
+            yield numbered(result)
+            for copy in copies_ready(result):
+                copies += 1
+                yield numbered(copy)
+
+    async for result in bulk_score_resumes(
+        scoring_source,
+        job_description,
+        use_cache=not bypass_cache,
+        batch_size=BATCH_MAX_SIZE if batch_mode else 1,
+    ):
+        if parse_progress["done"] and not total_final:
+            total = parse_progress["parsed"]
+            total_final = True
+            yield {'type': 'total', 'total': total, 'estimated': False}
+
+        for row in failures_ready():
+            yield row
+        errors += bool(result.get("error"))
+        yield numbered(result)
+        for copy in copies_ready(result):
+            copies += 1
+            yield numbered(copy)
+
+    # Files that failed after the last result, or when none could be parsed
+    if not total_final:
+        total = parse_progress["parsed"]
+        yield {'type': 'total', 'total': total, 'estimated': False}
+    for row in failures_ready():
+        yield row
+
+    # Copies parsed after their representative's result went out
+    for copy in copies_ready():
+        copies += 1
+        yield numbered(copy)
+
+    # Store results for CSV download
+    get_results_store().put(f"bulk:{session_id}", results)
+
+    # Settle credits after ALL processing is done. Pre-screened resumes and
+    # duplicates never reached the LLM, and rows that errored are refunded
+    credits_remaining = None
+    if reservation_id:
+        with session_scope() as db:
+            credits_remaining = settle_credits(db, reservation_id, used=processed - prescreened - copies - errors)
+
+    # Send completion event
+    shortlisted = sum(1 for r in results if r.get("score", 0) >= 60)
+    avg_score = round(sum(r.get("score", 0) for r in results) / max(len(results), 1), 1)
+    yield {'type': 'complete', 'total': processed, 'processed': processed, 'shortlisted': shortlisted, 'avg_score': avg_score, 'session_id': session_id, 'credits_remaining': credits_remaining, 'duplicates': copies}
+
+
+def _parse_error_row(filename: str, error: str) -> dict:
+    """Result row for a resume that couldn't be parsed (shaped like a scoring error row)."""
+    return {
+        "filename": filename,
+        "score": 0,
+        "verdict": "Rejected",
+        "reason": f"Could not read this PDF: {error}",
+        "matching_skills": [],
+        "missing_skills": [],
+        "summary": f"Could not read this PDF: {error}",
+        "error": True,
+    }
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# ── Reconciliation ────────────────────────
+def reconcile_reservations() -> int:
+    """
+    Refund credits that no job will ever settle: those of in-process
+    sessions whose web worker died (their lease lapsed), and any
+    reservation still open after CREDIT_RESERVATION_TTL. Each refunded
+    session is finished with an error event. Blocking; returns how many
+    reservations were released.
+    """
+    log = get_session_log()
+    released = 0
+    with session_scope() as db:
+        for session_id in log.expire_lost_sessions():
+            released += release_session_credits(db, session_id)
+        for session_id in release_stale_reservations(db, CREDIT_RESERVATION_TTL):
+            released += 1
+            if session_id:
+                log.fail(session_id, STALE_RESERVATION_MESSAGE)
+    return released
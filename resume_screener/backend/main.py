@@ -1,32 +1,102 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, StreamingResponse, Response
 from sqlalchemy.orm import Session
 import uvicorn
+import logging
 import os
-import json
 import uuid
+import zipfile
 import asyncio
 from pathlib import Path
+from typing import Optional, Union
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from database import engine, get_db, Base
+from database import engine, get_db, session_scope, pool_stats, Base
 from models import User, Transaction
-from auth import get_current_user, check_credits, deduct_credits
-from utils.parser import extract_text_from_pdf, extract_pdfs_from_zip, extract_jds_from_zip
-from utils.llm_logic import score_resume, bulk_score_resumes, bulk_score_resume_against_jds
+from auth import (
+    get_current_user, reserve_credits, settle_credits, release_credits,
+    get_jwks_manager, verified_tokens, identity_cache,
+)
+from jobs import run_bulk_job, reconcile_reservations, remove_files
+from utils.parser import (
+    aextract_text_from_pdf, aextract_jds_from_zip, count_zip_pdfs, spool_upload, shutdown_parse_pool,
+    parse_stats, PDF_MAX_BYTES,
+)
+from utils.text_cache import get_text_cache
+from utils.llm_logic import ascore_resume, bulk_score_resume_against_jds
+from utils.score_cache import get_score_cache
+from utils.results_store import get_results_store
+from utils.job_queue import get_job_queue, JOB_SPOOL_DIR
+from utils.rate_limiter import get_limiter, limiter_key
+from utils import resilience
+from utils.context_cache import get_context_cache
+from utils.llm_providers import llm_provider, resolve_provider
+from utils.compaction import budget_for_plan, resume_token_budget, warm_encoding
+from utils.session_log import SESSION_LEASE_TTL, SESSION_PURGE_INTERVAL, get_session_log, start_session_job
 from utils.csv_export import generate_csv, generate_reverse_csv
 from routes.auth_routes import router as auth_router
 from routes.payment_routes import router as payment_router
 
+logger = logging.getLogger(__name__)
+
+# Lost sessions are noticed within about one lease TTL
+SESSION_MAINTENANCE_INTERVAL = min(SESSION_PURGE_INTERVAL, SESSION_LEASE_TTL)
+
 # ── Create DB tables on startup ──────────
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="ASR Services")
 
+@app.on_event("startup")
+async def _start_jwks_refresh():
+    # Load Clerk signing keys before the first request and keep them fresh
+    await get_jwks_manager().start()
+
+
+@app.on_event("shutdown")
+async def _stop_jwks_refresh():
+    await get_jwks_manager().stop()
+
+
+async def _maintenance_loop():
+    while True:
+        try:
+            released = await asyncio.to_thread(reconcile_reservations)
+            if released:
+                logger.warning(f"Refunded {released} credit reservation(s) of lost jobs")
+            await asyncio.to_thread(get_session_log().purge)
+        except Exception as e:
+            logger.error(f"Session log maintenance failed: {e}")
+        await asyncio.sleep(SESSION_MAINTENANCE_INTERVAL)
+
+
+@app.on_event("startup")
+async def _warm_tokenizer():
+    # Token counting loads (and on first run downloads) its vocabulary
+    await asyncio.to_thread(warm_encoding)
+
+
+@app.on_event("startup")
+async def _start_maintenance():
+    # Refund credits of jobs lost in a crash (first pass right at startup)
+    # and purge expired sessions, off the request path
+    app.state.maintenance = asyncio.create_task(_maintenance_loop())
+
+
+@app.on_event("shutdown")
+async def _stop_maintenance():
+    app.state.maintenance.cancel()
+
+
+@app.on_event("shutdown")
+def _shutdown_parse_pool():
+    shutdown_parse_pool()
+
+
 # Include API routers
 app.include_router(auth_router)
 app.include_router(payment_router)
@@ -40,9 +110,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory store for bulk results (keyed by session_id)
-bulk_results_store: dict[str, list[dict]] = {}
-reverse_results_store: dict[str, list[dict]] = {}
+def _sse_response(frames, db: Optional[Session] = None) -> StreamingResponse:
+    """
+    Stream SSE frames. The request's session is closed first: FastAPI only
+    closes it once the response ends, and a session that has run a query
+    keeps its pooled connection checked out for the whole stream.
+    """
+    if db is not None:
+        db.close()
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+# Bulk/reverse results for CSV download, keyed by "<mode>:<session_id>".
+# Bounded and TTL-evicted; the default SQLite backend is shared across workers.
+results_store = get_results_store()
 
 
 # ── Single Resume Analyze (protected) ────────────────────────
@@ -52,38 +141,41 @@ async def seniority_analyze(
     resume: UploadFile = File(...),
     job_description: str = Form(None),
     job_description_file: UploadFile = File(None),
+    bypass_cache: bool = Form(False),
+    provider: Optional[str] = Form(None),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    # Check credits BEFORE analysis
-    check_credits(user, required=1)
+    limiter_key.set((f"user:{user.id}", ""))
+    _route_llm(user, provider)
 
     if not resume.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF resumes are supported.")
 
+    # Reserve the credit BEFORE analysis; it's refunded if the analysis fails
+    reservation_id = reserve_credits(db, user, 1, reason="analyze")
     try:
         resume_content = await resume.read()
-        resume_text = extract_text_from_pdf(resume_content)
+        resume_text = await aextract_text_from_pdf(resume_content)
 
         final_jd = job_description
         if job_description_file and job_description_file.filename.endswith(".pdf"):
             jd_content = await job_description_file.read()
-            final_jd = extract_text_from_pdf(jd_content)
+            final_jd = await aextract_text_from_pdf(jd_content)
 
         if not final_jd:
             raise HTTPException(status_code=400, detail="Job description text or PDF is required.")
 
-        analysis = score_resume(resume_text, final_jd)
-
-        # Deduct 1 credit after successful analysis
-        deduct_credits(db, user, count=1)
+        analysis = await ascore_resume(resume_text, final_jd, use_cache=not bypass_cache)
 
-        # Return analysis with remaining credits
-        analysis["credits_remaining"] = user.resume_credits
+        # Charge the credit after successful analysis and return the remaining balance
+        analysis["credits_remaining"] = settle_credits(db, reservation_id, used=1)
         return analysis
     except HTTPException:
+        release_credits(db, reservation_id)
         raise
     except Exception as e:
+        release_credits(db, reservation_id)
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -96,6 +188,13 @@ async def bulk_analyze(
     resumes: list[UploadFile] = File(...),
     job_description: str = Form(None),
     job_description_file: UploadFile = File(None),
+    bypass_cache: bool = Form(False),
+    batch_mode: bool = Form(False),
+    prescreen_top_k: Optional[int] = Form(None),
+    prescreen_threshold: Optional[float] = Form(None),
+    dedup: bool = Form(True),
+    dedup_near: bool = Form(False),
+    provider: Optional[str] = Form(None),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -103,98 +202,233 @@ async def bulk_analyze(
     Accepts multiple resume PDFs (or a single ZIP) + a job description.
     Returns Server-Sent Events streaming each scored result in real-time.
     """
+    provider = _route_llm(user, provider)
+
     # 1. Extract job description
     final_jd = job_description
     if job_description_file and job_description_file.filename and job_description_file.filename.endswith(".pdf"):
         jd_content = await job_description_file.read()
-        final_jd = extract_text_from_pdf(jd_content)
+        final_jd = await aextract_text_from_pdf(jd_content)
 
     if not final_jd:
         raise HTTPException(status_code=400, detail="Job description text or PDF is required.")
 
-    # 2. Extract all resumes
-    resume_pairs: list[tuple[str, str]] = []  # (filename, text)
+    # 2. Collect resume uploads and estimate the batch size. PDFs are parsed
+    #    lazily and fed straight into scoring, so results start streaming
+    #    before the whole batch has been extracted.
+    pdf_uploads, zip_paths, estimated_total = await _collect_resume_uploads(resumes)
 
-    for upload in resumes:
-        content = await upload.read()
-        fname = upload.filename or "unknown.pdf"
+    # 3. Reserve credits BEFORE processing (estimate is an upper bound; only
+    #    resumes that actually get AI-scored are charged, the rest is refunded)
+    session_id = str(uuid.uuid4())
+    try:
+        reservation_id = _reserve_bulk_credits(db, user, estimated_total, prescreen_top_k, session_id)
+    except BaseException:
+        remove_files(zip_paths)
+        raise
 
-        if fname.lower().endswith(".zip"):
-            pairs = extract_pdfs_from_zip(content)
-            resume_pairs.extend(pairs)
-        elif fname.lower().endswith(".pdf"):
-            try:
-                text = extract_text_from_pdf(content)
-                if text:
-                    resume_pairs.append((fname, text))
-            except Exception:
-                pass
-        # Silently skip non-PDF/non-ZIP files
+    # 4. Run the job in the background (it survives client disconnects) and
+    #    stream its persisted events via SSE
+    events = run_bulk_job(
+        session_id, user.id, final_jd, pdf_uploads, zip_paths, estimated_total,
+        bypass_cache=bypass_cache,
+        batch_mode=batch_mode,
+        prescreen_top_k=prescreen_top_k,
+        prescreen_threshold=prescreen_threshold,
+        provider=provider,
+        token_budget=budget_for_plan(user.plan_type),
+        dedup=dedup,
+        dedup_near=dedup_near,
+        reservation_id=reservation_id,
+    )
+    await start_session_job(session_id, user.id, events)
+    return _sse_response(get_session_log().tail(session_id), db)
 
-    if not resume_pairs:
-        raise HTTPException(status_code=400, detail="No valid PDF resumes found in the uploaded files.")
 
-    total = len(resume_pairs)
+async def _collect_resume_uploads(
+    resumes: list[UploadFile],
+    spool_dir: Optional[str] = None,
+) -> tuple[list[tuple[str, Union[bytes, str]]], list[str], int]:
+    """
+    Split resume uploads into PDFs and disk-spooled ZIPs and estimate how
+    many resumes they contain. With `spool_dir`, PDFs are spooled to files
+    there too (for queued jobs); otherwise their bytes are kept in memory.
+    Raises 400 if nothing usable was uploaded.
+    """
+    pdf_uploads: list[tuple[str, Union[bytes, str]]] = []  # (filename, bytes or spooled path)
+    zip_paths: list[str] = []
+    estimated_total = 0
 
-    # 3. Check credits BEFORE processing
-    check_credits(user, required=total)
+    try:
+        for upload in resumes:
+            fname = upload.filename or "unknown.pdf"
+
+            if fname.lower().endswith(".zip"):
+                zip_path = await spool_upload(upload, directory=spool_dir)
+                zip_paths.append(zip_path)
+                try:
+                    estimated_total += count_zip_pdfs(zip_path)
+                except zipfile.BadZipFile:
+                    continue
+            elif fname.lower().endswith(".pdf"):
+                estimated_total += 1
+                if spool_dir:
+                    content = await spool_upload(upload, max_bytes=PDF_MAX_BYTES, suffix=".pdf", directory=spool_dir)
+                else:
+                    content = await upload.read()
+                pdf_uploads.append((fname, content))
+            # Silently skip non-PDF/non-ZIP files
+
+        if not estimated_total:
+            raise HTTPException(status_code=400, detail="No valid PDF resumes found in the uploaded files.")
+    except BaseException as e:
+        remove_files(zip_paths + [c for _, c in pdf_uploads if isinstance(c, str)])
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
 
-    session_id = str(uuid.uuid4())
+    return pdf_uploads, zip_paths, estimated_total
 
-    # Capture user_id for use in the generator (avoid session issues)
-    user_id = user.id
 
-    # 4. Stream results via SSE
-    async def event_stream():
-        results = []
-        processed = 0
+def _route_llm(user: User, requested: Optional[str]) -> str:
+    """
+    Route this request's LLM calls by plan (or an allowed explicit choice); 400 if not allowed.
+    Also applies the plan's resume token budget (see utils/compaction).
+    """
+    try:
+        provider = resolve_provider(user.plan_type, requested)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    llm_provider.set(provider)
+    resume_token_budget.set(budget_for_plan(user.plan_type))
+    return provider
 
-        # Send initial metadata
-        yield f"data: {json.dumps({'type': 'start', 'total': total, 'session_id': session_id})}\n\n"
 
-        async for result in bulk_score_resumes(resume_pairs, final_jd, concurrency=20):
-            processed += 1
-            result["index"] = processed
-            result["total"] = total
-            result["type"] = "result"
-            results.append(result)
-            yield f"data: {json.dumps(result)}\n\n"
+def _reserve_bulk_credits(
+    db: Session, user: User, estimated_total: int, prescreen_top_k: Optional[int], session_id: str
+) -> str:
+    required = estimated_total
+    if prescreen_top_k is not None:
+        required = min(required, max(prescreen_top_k, 0))
+    return reserve_credits(db, user, required, reason="bulk", session_id=session_id)
 
-        # Store results for CSV download
-        bulk_results_store[session_id] = results
 
-        # Deduct credits after ALL processing is done
-        deduct_db = next(get_db())
-        try:
-            db_user = deduct_db.query(User).filter(User.id == user_id).first()
-            if db_user:
-                deduct_credits(deduct_db, db_user, count=total)
-                credits_remaining = db_user.resume_credits
-            else:
-                credits_remaining = 0
-        finally:
-            deduct_db.close()
+# ── Queued Bulk Jobs (protected) ─────────────────────────────
+# Same pipeline as /bulk-analyze, but run by worker.py processes draining a
+# persistent queue instead of inside this web worker.
 
-        # Send completion event
-        shortlisted = sum(1 for r in results if r.get("score", 0) >= 60)
-        avg_score = round(sum(r.get("score", 0) for r in results) / max(len(results), 1), 1)
-        yield f"data: {json.dumps({'type': 'complete', 'total': total, 'processed': processed, 'shortlisted': shortlisted, 'avg_score': avg_score, 'session_id': session_id, 'credits_remaining': credits_remaining})}\n\n"
+@app.post("/jobs/bulk")
+async def submit_bulk_job(
+    resumes: list[UploadFile] = File(...),
+    job_description: str = Form(None),
+    job_description_file: UploadFile = File(None),
+    bypass_cache: bool = Form(False),
+    batch_mode: bool = Form(False),
+    prescreen_top_k: Optional[int] = Form(None),
+    prescreen_threshold: Optional[float] = Form(None),
+    dedup: bool = Form(True),
+    dedup_near: bool = Form(False),
+    provider: Optional[str] = Form(None),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Queue a bulk screening batch and return its job id immediately.
+    Follow progress with GET /jobs/{job_id} (polling) or GET /stream/{job_id} (SSE).
+    """
+    provider = _route_llm(user, provider)
 
-    return StreamingResponse(
-        event_stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
-    )
+    final_jd = job_description
+    if job_description_file and job_description_file.filename and job_description_file.filename.endswith(".pdf"):
+        jd_content = await job_description_file.read()
+        final_jd = await aextract_text_from_pdf(jd_content)
+
+    if not final_jd:
+        raise HTTPException(status_code=400, detail="Job description text or PDF is required.")
+
+    os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+    pdf_uploads, zip_paths, estimated_total = await _collect_resume_uploads(resumes, spool_dir=JOB_SPOOL_DIR)
+    # The job id doubles as the session id for /stream and CSV download
+    job_id = str(uuid.uuid4())
+    try:
+        reservation_id = _reserve_bulk_credits(db, user, estimated_total, prescreen_top_k, job_id)
+    except BaseException:
+        remove_files(zip_paths + [path for _, path in pdf_uploads])
+        raise
+
+    await get_session_log().acreate(job_id, user.id)
+    await asyncio.to_thread(get_job_queue().submit, user.id, "bulk", {
+        "job_description": final_jd,
+        "pdf_uploads": pdf_uploads,
+        "zip_paths": zip_paths,
+        "estimated_total": estimated_total,
+        "bypass_cache": bypass_cache,
+        "batch_mode": batch_mode,
+        "prescreen_top_k": prescreen_top_k,
+        "prescreen_threshold": prescreen_threshold,
+        "provider": provider,
+        "token_budget": budget_for_plan(user.plan_type),
+        "dedup": dedup,
+        "dedup_near": dedup_near,
+        "reservation_id": reservation_id,
+    }, job_id=job_id)
+
+    return {"job_id": job_id, "session_id": job_id, "status": "queued", "estimated_total": estimated_total}
+
+
+@app.get("/jobs/{job_id}")
+async def get_bulk_job(
+    job_id: str,
+    include_results: bool = False,
+    user: User = Depends(get_current_user),
+):
+    """Poll a queued job's status; finished jobs can include their results."""
+    job = get_job_queue().get(job_id)
+    if job is None or job["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    response = {
+        "job_id": job_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "queue_position": get_job_queue().position(job_id) if job["status"] == "queued" else 0,
+    }
+    if include_results and job["status"] == "done":
+        response["results"] = results_store.get(f"bulk:{job_id}") or []
+    return response
+
+
+@app.get("/stream/{session_id}")
+async def resume_stream(
+    session_id: str,
+    request: Request,
+    since: Optional[int] = None,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Reconnect to a bulk or reverse screening session. Replays every event
+    after `since` (or the Last-Event-ID header), then continues live until
+    the job completes.
+    """
+    owner = await get_session_log().aowner(session_id)
+    if owner is None or owner[0] != user.id:
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+
+    if since is None:
+        try:
+            since = int(request.headers.get("Last-Event-ID", "0"))
+        except ValueError:
+            since = 0
+
+    return _sse_response(get_session_log().tail(session_id, since=since), db)
 
 
 @app.get("/download-results/{session_id}")
 async def download_results(session_id: str):
     """Download bulk screening results as CSV."""
-    results = bulk_results_store.get(session_id)
+    results = results_store.get(f"bulk:{session_id}")
     if not results:
         raise HTTPException(status_code=404, detail="Results not found or expired.")
 
@@ -212,6 +446,8 @@ async def download_results(session_id: str):
 async def reverse_analyze(
     resume: UploadFile = File(...),
     job_descriptions: list[UploadFile] = File(...),
+    bypass_cache: bool = Form(False),
+    provider: Optional[str] = Form(None),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -219,12 +455,14 @@ async def reverse_analyze(
     Accepts 1 resume PDF + multiple JD PDFs (or a single ZIP of JDs).
     Returns Server-Sent Events streaming each scored result in real-time.
     """
+    _route_llm(user, provider)
+
     # 1. Extract resume text
     if not resume.filename or not resume.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Resume must be a PDF file.")
 
     resume_content = await resume.read()
-    resume_text = extract_text_from_pdf(resume_content)
+    resume_text = await aextract_text_from_pdf(resume_content)
     if not resume_text:
         raise HTTPException(status_code=400, detail="Could not extract text from resume PDF.")
 
@@ -232,15 +470,24 @@ async def reverse_analyze(
     jd_pairs: list[tuple[str, str]] = []  # (jd_filename, text)
 
     for upload in job_descriptions:
-        content = await upload.read()
         fname = upload.filename or "unknown.pdf"
 
         if fname.lower().endswith(".zip"):
-            pairs = extract_jds_from_zip(content)
+            try:
+                zip_path = await spool_upload(upload)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                pairs = await aextract_jds_from_zip(zip_path)
+            except (zipfile.BadZipFile, ValueError):
+                pairs = []
+            finally:
+                remove_files([zip_path])
             jd_pairs.extend(pairs)
         elif fname.lower().endswith(".pdf"):
+            content = await upload.read()
             try:
-                text = extract_text_from_pdf(content)
+                text = await aextract_text_from_pdf(content)
                 if text:
                     jd_pairs.append((fname, text))
             except Exception:
@@ -251,62 +498,56 @@ async def reverse_analyze(
 
     total = len(jd_pairs)
 
-    # 3. Check credits BEFORE processing
-    check_credits(user, required=total)
-
+    # 3. Reserve credits BEFORE processing
     session_id = str(uuid.uuid4())
+    reservation_id = reserve_credits(db, user, total, reason="reverse", session_id=session_id)
+
     user_id = user.id
+    limiter_key.set((f"user:{user_id}", session_id))
 
-    # 4. Stream results via SSE
-    async def event_stream():
+    # 4. Run the job in the background and stream its persisted events via SSE
+    async def job_events():
         results = []
         processed = 0
+        errors = 0
 
-        yield f"data: {json.dumps({'type': 'start', 'total': total, 'session_id': session_id})}\n\n"
+        yield {'type': 'start', 'total': total, 'session_id': session_id}
 
-        async for result in bulk_score_resume_against_jds(resume_text, jd_pairs, concurrency=20):
-            processed += 1
-            result["index"] = processed
-            result["total"] = total
-            result["type"] = "result"
-            results.append(result)
-            yield f"data: {json.dumps(result)}\n\n"
+        try:
+            async for result in bulk_score_resume_against_jds(resume_text, jd_pairs, use_cache=not bypass_cache):
+                processed += 1
+                errors += bool(result.get("error"))
+                result["index"] = processed
+                result["total"] = total
+                result["type"] = "result"
+                results.append(result)
+                yield result
+        except BaseException:
+            # The job died: refund everything it reserved
+            with session_scope() as release_db:
+                release_credits(release_db, reservation_id)
+            raise
 
         # Store results for CSV download
-        reverse_results_store[session_id] = results
+        results_store.put(f"reverse:{session_id}", results)
 
-        # Deduct credits
-        deduct_db = next(get_db())
-        try:
-            db_user = deduct_db.query(User).filter(User.id == user_id).first()
-            if db_user:
-                deduct_credits(deduct_db, db_user, count=total)
-                credits_remaining = db_user.resume_credits
-            else:
-                credits_remaining = 0
-        finally:
-            deduct_db.close()
+        # Settle credits: JDs that errored are refunded
+        with session_scope() as settle_db:
+            credits_remaining = settle_credits(settle_db, reservation_id, used=processed - errors)
 
         # Send completion event
         matched = sum(1 for r in results if r.get("score", 0) >= 60)
         avg_score = round(sum(r.get("score", 0) for r in results) / max(len(results), 1), 1)
-        yield f"data: {json.dumps({'type': 'complete', 'total': total, 'processed': processed, 'matched': matched, 'avg_score': avg_score, 'session_id': session_id, 'credits_remaining': credits_remaining})}\n\n"
+        yield {'type': 'complete', 'total': total, 'processed': processed, 'matched': matched, 'avg_score': avg_score, 'session_id': session_id, 'credits_remaining': credits_remaining}
 
-    return StreamingResponse(
-        event_stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
-    )
+    await start_session_job(session_id, user_id, job_events())
+    return _sse_response(get_session_log().tail(session_id), db)
 
 
 @app.get("/download-reverse-results/{session_id}")
 async def download_reverse_results(session_id: str):
     """Download reverse screening results as CSV."""
-    results = reverse_results_store.get(session_id)
+    results = results_store.get(f"reverse:{session_id}")
     if not results:
         raise HTTPException(status_code=404, detail="Results not found or expired.")
 
@@ -318,6 +559,26 @@ async def download_reverse_results(session_id: str):
     )
 
 
+# ── Scoring Cache Metrics ────────────────
+
+@app.get("/cache-stats")
+async def cache_stats(user: User = Depends(get_current_user)):
+    """Cache hit rates, LLM limiter and retry counters, parsing, auth and DB pool state."""
+    return {
+        "score_cache": get_score_cache().stats(),
+        "results_store": results_store.stats(),
+        "llm_limiter": get_limiter().stats(),
+        "llm_resilience": resilience.stats(),
+        "context_cache": get_context_cache().stats(),
+        "pdf_parse": parse_stats(),
+        "text_cache": get_text_cache().stats(),
+        "jwks": get_jwks_manager().stats(),
+        "verified_tokens": verified_tokens.stats(),
+        "identity_cache": identity_cache.stats(),
+        "db_pool": pool_stats(),
+    }
+
+
 # --- Serve Frontend Static Files ---
 FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend" / "dist"
 
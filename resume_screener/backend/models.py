@@ -35,3 +35,18 @@ class Transaction(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     user = relationship("User", back_populates="transactions")
+
+
+# Credits held for one analysis or bulk job and what was finally charged (audit trail)
+class CreditReservation(Base):
+    __tablename__ = "credit_reservations"
+
+    id = Column(String(36), primary_key=True)  # uuid4
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    amount = Column(Integer, nullable=False)  # credits reserved
+    used = Column(Integer, nullable=True)  # credits charged once settled; the rest was refunded
+    status = Column(String(20), default="reserved")  # reserved, committed, released
+    reason = Column(String(20), nullable=False)  # analyze, bulk, reverse
+    session_id = Column(String(36), nullable=True, index=True)  # bulk/reverse session (or queued job) it pays for
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    settled_at = Column(DateTime, nullable=True)
@@ -9,7 +9,7 @@ from sqlalchemy.orm import Session
 from database import get_db
 from models import User, Transaction
 from schemas import PlanInfo, OrderCreate, PaymentVerify
-from auth import get_current_user
+from auth import get_current_user, identity_cache
 
 router = APIRouter(prefix="/api", tags=["payments"])
 
@@ -123,7 +123,8 @@ def verify_payment(
     txn.razorpay_signature = data.razorpay_signature
     txn.payment_status = "success"
 
-    # Add credits to user
+    # Add credits to user (reloaded: `user` may be an identity cache snapshot)
+    db.refresh(user)
     plan = PLANS.get(txn.plan_bought)
     if plan:
         if plan.id == "unlimited":
@@ -136,6 +137,7 @@ def verify_payment(
 
     db.commit()
     db.refresh(user)
+    identity_cache.invalidate(user.clerk_id)
 
     return {
         "message": "Payment successful! Credits added.",
@@ -187,5 +189,7 @@ async def razorpay_webhook(request: Request, db: Session = Depends(get_db)):
                     user.resume_credits += plan.credits
                     txn.credits_added = plan.credits
             db.commit()
+            if user:
+                identity_cache.invalidate(user.clerk_id)
 
     return {"status": "ok"}
@@ -0,0 +1,30 @@
+"""
+Shared test setup. Every store is pointed at a throwaway directory and
+scoring is routed to the mock LLM before any app module is imported, since
+those modules read their settings at import time.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_state_dir = tempfile.mkdtemp(prefix="asr_tests_")
+atexit.register(shutil.rmtree, _state_dir, True)
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_state_dir, 'app.db')}",
+    "SCORE_CACHE_PATH": os.path.join(_state_dir, "score_cache.db"),
+    "RESULTS_STORE_PATH": os.path.join(_state_dir, "results_store.db"),
+    "SESSION_LOG_PATH": os.path.join(_state_dir, "session_log.db"),
+    "JOB_QUEUE_PATH": os.path.join(_state_dir, "job_queue.db"),
+    "JOB_SPOOL_DIR": os.path.join(_state_dir, "job_spool"),
+    "TEXT_CACHE_PATH": os.path.join(_state_dir, "text_cache.db"),
+    "LLM_PROVIDER": "mock",
+    "LLM_PLAN_PROVIDERS": "",
+    "MOCK_LLM_LATENCY": "0",
+    "CONTEXT_CACHE_PROVIDER": "stub",
+})
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from utils.context_cache import get_context_cache
+from utils.llm_logic import bulk_score_resumes
+from utils.llm_providers import MockChatModel, mock_score, supports_context_cache
+
+JD = "Senior Python developer: FastAPI, PostgreSQL, Docker, Kubernetes, asyncio and SQLAlchemy."
+RESUMES = [
+    ("alice.pdf", "Python developer with FastAPI, asyncio and PostgreSQL experience."),
+    ("bob.pdf", "Java engineer, Spring Boot and Oracle; some Docker."),
+    ("carol.pdf", "Kubernetes and Docker platform engineer who writes Python and SQLAlchemy."),
+    ("dave.pdf", "Data analyst: SQL, Excel and some Python."),
+]
+
+
+def test_stub_cache_pairs_with_the_mock_model_only():
+    assert supports_context_cache("mock")
+    assert not supports_context_cache("gemini")
+    assert not supports_context_cache("openai")
+
+
+@pytest.mark.parametrize("batch_size", [1, 2])
+def test_bulk_scoring_reads_the_jd_from_the_stub_cache(monkeypatch, batch_size):
+    cache = get_context_cache()
+    monkeypatch.setattr(cache, "min_tokens", 1)
+    calls = []
+    agenerate = MockChatModel._agenerate
+
+    async def recording_agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        calls.append((kwargs.get("cached_content"), cache.provider.entries.get(kwargs.get("cached_content"))))
+        return await agenerate(self, messages, stop, run_manager, **kwargs)
+
+    monkeypatch.setattr(MockChatModel, "_agenerate", recording_agenerate)
+
+    async def run():
+        return [r async for r in bulk_score_resumes(RESUMES, JD, use_cache=False, batch_size=batch_size)]
+
+    created = cache.created
+    results = asyncio.run(run())
+
+    assert cache.created == created + 1
+    assert calls and all(name and entry and JD in entry[2] for name, entry in calls)
+    # Only the resumes were sent; the JD came from the cache entry
+    scores = {r["filename"]: r["score"] for r in results}
+    assert scores == {fname: mock_score(text, JD)["score"] for fname, text in RESUMES}
+    assert cache.provider.entries == {}  # released when the job ended
@@ -0,0 +1,110 @@
+import json
+import uuid
+
+import pytest
+
+import jobs
+import worker
+from auth import release_credits, reserve_credits, settle_credits
+from database import Base, engine, session_scope
+from models import CreditReservation, User
+from utils.session_log import LOST_SESSION_MESSAGE, get_session_log
+
+Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture
+def db():
+    with session_scope() as db:
+        yield db
+
+
+@pytest.fixture
+def user(db):
+    user = User(clerk_id=f"user_{uuid.uuid4().hex}", email=f"{uuid.uuid4().hex}@example.com", resume_credits=10)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _balance(db, user) -> int:
+    return db.query(User.resume_credits).filter(User.id == user.id).scalar()
+
+
+def _status(db, reservation_id) -> str:
+    return db.query(CreditReservation.status).filter(CreditReservation.id == reservation_id).scalar()
+
+
+def test_settle_charges_used_and_refunds_the_rest(db, user):
+    reservation_id = reserve_credits(db, user, 4, reason="bulk")
+    assert _balance(db, user) == 6
+
+    assert settle_credits(db, reservation_id, used=3) == 7
+    assert _status(db, reservation_id) == "committed"
+    # Settling twice (a retried job) changes nothing
+    assert settle_credits(db, reservation_id, used=3) is None
+    assert _balance(db, user) == 7
+
+
+def test_release_refunds_everything(db, user):
+    reservation_id = reserve_credits(db, user, 5, reason="reverse")
+    assert release_credits(db, reservation_id) == 10
+    assert _status(db, reservation_id) == "released"
+
+
+def test_reserve_more_than_balance_is_refused(db, user):
+    with pytest.raises(Exception) as exc:
+        reserve_credits(db, user, 11, reason="bulk")
+    assert exc.value.status_code == 403
+    assert _balance(db, user) == 10
+
+
+def test_abandoned_job_refunds_credits_and_finishes_its_session(db, user, tmp_path):
+    job_id = str(uuid.uuid4())
+    reservation_id = reserve_credits(db, user, 7, reason="bulk", session_id=job_id)
+    spooled = tmp_path / "upload.zip"
+    spooled.write_bytes(b"zip")
+    get_session_log().create(job_id, user.id)
+
+    worker.abandon_job({
+        "id": job_id,
+        "payload": {"reservation_id": reservation_id, "zip_paths": [str(spooled)], "pdf_uploads": []},
+    })
+
+    db.expire_all()
+    assert _balance(db, user) == 10
+    assert _status(db, reservation_id) == "released"
+    assert not spooled.exists()
+    rows, done = get_session_log().read(job_id, since=0)
+    assert done and json.loads(rows[-1][1])["type"] == "error"
+
+
+def test_reconcile_refunds_sessions_whose_worker_died(db, user):
+    log = get_session_log()
+    session_id = str(uuid.uuid4())
+    reservation_id = reserve_credits(db, user, 3, reason="bulk", session_id=session_id)
+    log.create(session_id, user.id)
+    log.renew_lease(session_id, ttl=-1)  # the web worker running it crashed
+
+    assert jobs.reconcile_reservations() == 1
+    db.expire_all()
+    assert _balance(db, user) == 10
+    assert _status(db, reservation_id) == "released"
+    rows, done = log.read(session_id, since=0)
+    assert done and json.loads(rows[-1][1])["message"] == LOST_SESSION_MESSAGE
+
+
+def test_reconcile_refunds_stale_reservations(db, user, monkeypatch):
+    log = get_session_log()
+    session_id = str(uuid.uuid4())
+    reservation_id = reserve_credits(db, user, 2, reason="reverse", session_id=session_id)
+    log.create(session_id, user.id)  # crashed before it took a lease
+    assert jobs.reconcile_reservations() == 0
+
+    monkeypatch.setattr(jobs, "CREDIT_RESERVATION_TTL", -1)
+    assert jobs.reconcile_reservations() >= 1
+    db.expire_all()
+    assert _balance(db, user) == 10
+    assert _status(db, reservation_id) == "released"
+    rows, done = log.read(session_id, since=0)
+    assert done and json.loads(rows[-1][1])["message"] == jobs.STALE_RESERVATION_MESSAGE
@@ -0,0 +1,48 @@
+import asyncio
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from jobs import run_bulk_job
+from utils import parser
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    pool = ProcessPoolExecutor(max_workers=1)
+    monkeypatch.setattr(parser, "_pool", pool)
+    yield pool
+    parser.shutdown_parse_pool()
+
+
+def test_queue_wait_does_not_count_against_the_deadline(small_pool, monkeypatch):
+    monkeypatch.setattr(parser, "PDF_PARSE_TIMEOUT", 0.5)
+    monkeypatch.setattr(parser, "PDF_PARSE_KILL_GRACE", 0)
+
+    async def run():
+        # One worker, six 0.3s tasks: the last one waits ~1.5s in the queue
+        return await asyncio.gather(*(parser._run_in_pool(time.sleep, 0.3) for _ in range(6)))
+
+    assert asyncio.run(run()) == [None] * 6
+    assert parser._pool is small_pool  # nothing was recycled
+
+
+def test_unreadable_resumes_become_error_rows(tmp_path, small_pool):
+    zip_path = tmp_path / "resumes.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("batch/broken.pdf", b"not a pdf")
+
+    async def run():
+        return [event async for event in run_bulk_job(
+            "parse-errors", 1, "Python developer", [("upload.pdf", b"also not a pdf")], [str(zip_path)], 2,
+        )]
+
+    events = asyncio.run(run())
+    rows = [event for event in events if event["type"] == "result"]
+    assert sorted(row["filename"] for row in rows) == ["broken.pdf", "upload.pdf"]
+    assert all(row["error"] and row["reason"].startswith("Could not read this PDF") for row in rows)
+    assert [row["index"] for row in rows] == [1, 2]
+    assert {"type": "total", "total": 2, "estimated": False} in events
+    assert events[-1]["type"] == "complete" and events[-1]["processed"] == 2
@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+from google.genai import errors as genai_errors
+
+from utils.rate_limiter import AdaptiveLimiter, is_throttle_error
+
+
+def _genai_error(cls, code: int, status: str, message: str = "boom"):
+    return cls(code, {"error": {"code": code, "status": status, "message": message}})
+
+
+def _openai_error(code: int):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(code, request=request)
+    return openai.APIStatusError("boom", response=response, body=None)
+
+
+@pytest.mark.parametrize("exc", [
+    _genai_error(genai_errors.ClientError, 429, "RESOURCE_EXHAUSTED"),
+    _genai_error(genai_errors.ServerError, 503, "UNAVAILABLE"),
+    _openai_error(429),
+    _openai_error(502),
+    Exception("429 Too Many Requests"),
+    Exception("Error calling model: RESOURCE_EXHAUSTED (quota)"),
+    Exception("HTTP 504 Gateway Timeout"),
+    Exception("The model is overloaded, try again"),
+])
+def test_throttle_errors(exc):
+    assert is_throttle_error(exc)
+
+
+@pytest.mark.parametrize("exc", [
+    _genai_error(genai_errors.ClientError, 400, "INVALID_ARGUMENT", "resume 429 is malformed"),
+    _genai_error(genai_errors.ServerError, 501, "UNIMPLEMENTED"),
+    _openai_error(401),
+    Exception("Processed 1500 resumes"),
+    Exception("Could not parse resume_5029.pdf"),
+    Exception("Score 4290 out of range"),
+    Exception("Invalid JSON in model output"),
+])
+def test_other_errors_are_not_throttles(exc):
+    assert not is_throttle_error(exc)
+
+
+def test_waiters_rotate_across_users_then_jobs():
+    async def run():
+        limiter = AdaptiveLimiter(initial=1, minimum=1, maximum=1, tokens_per_minute=10**9)
+        order = []
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+
+        async def call(user, job, label):
+            await limiter.call(lambda: asyncio.sleep(0, order.append(label)), key=(user, job))
+
+        holder = asyncio.create_task(limiter.call(hold, key=("user:0", "")))
+        await asyncio.sleep(0)
+        tasks = []
+        # user 1 queues a big job before a small one; user 2 queues after both
+        for label in ("a1", "a2", "a3"):
+            tasks.append(asyncio.create_task(call("user:1", "job-a", label)))
+        tasks.append(asyncio.create_task(call("user:1", "job-b", "b1")))
+        tasks.append(asyncio.create_task(call("user:2", "job-c", "c1")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(holder, *tasks)
+        return order
+
+    assert asyncio.run(run()) == ["a1", "c1", "b1", "a2", "a3"]
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import pytest
+
+from utils.session_log import LOST_SESSION_MESSAGE, SessionLog, get_session_log
+
+
+@pytest.fixture
+def log(tmp_path):
+    return SessionLog(str(tmp_path / "session_log.db"), ttl=3600)
+
+
+def _collect(log: SessionLog, session_id: str, since: int = 0) -> list[tuple[int, dict]]:
+    async def run():
+        frames = []
+        async for frame in log.tail(session_id, since=since):
+            lines = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+            frames.append((int(lines.get("id", 0)), json.loads(lines["data"])))
+        return frames
+
+    return asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+
+def test_tail_replays_events_after_since(log):
+    log.create("s1", user_id=1)
+    for i in range(5):
+        log.append("s1", {"type": "result", "index": i})
+    log.finish("s1")
+
+    assert [seq for seq, _ in _collect(log, "s1")] == [1, 2, 3, 4, 5]
+    resumed = _collect(log, "s1", since=3)
+    assert [(seq, event["index"]) for seq, event in resumed] == [(4, 3), (5, 4)]
+
+
+def test_concurrent_tailers_all_see_live_events(log):
+    log.create("s2", user_id=1)
+
+    async def run():
+        async def follow():
+            return [frame async for frame in log.tail("s2")]
+
+        tailers = [asyncio.create_task(follow()) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        for i in range(20):
+            await log.aappend("s2", {"type": "result", "index": i})
+        await log.afinish("s2")
+        return await asyncio.wait_for(asyncio.gather(*tailers), timeout=5)
+
+    assert [len(frames) for frames in asyncio.run(run())] == [20, 20, 20]
+    assert log._waiters == {}
+
+
+def test_lapsed_lease_ends_tail_and_is_expired_once(log):
+    log.create("s3", user_id=1)
+    log.append("s3", {"type": "start"})
+    log.renew_lease("s3", ttl=-1)  # the job's worker died
+
+    frames = _collect(log, "s3")
+    assert frames[-1][1] == {"type": "error", "message": LOST_SESSION_MESSAGE, "session_id": "s3"}
+
+    assert log.expire_lost_sessions() == ["s3"]
+    assert log.expire_lost_sessions() == []
+    rows, done = log.read("s3", since=1)
+    assert done and json.loads(rows[0][1])["type"] == "error"
+
+
+def test_finished_session_releases_its_lease(log):
+    log.create("s4", user_id=1)
+    log.renew_lease("s4", ttl=-1)
+    log.finish("s4")
+    assert not log.lease_expired("s4")
+    assert log.expire_lost_sessions() == []
+
+
+def test_purge_removes_only_expired_sessions(tmp_path):
+    log = SessionLog(str(tmp_path / "session_log.db"), ttl=-1)
+    log.create("old", user_id=1)
+    log.append("old", {"type": "start"})
+    assert log.purge() == 1
+    assert log.owner("old") is None
+
+    log.ttl = 3600
+    log.create("new", user_id=1)
+    assert log.purge() == 0
+    assert log.owner("new") is not None
+
+
+@pytest.fixture
+def client():
+    from types import SimpleNamespace
+
+    from fastapi.testclient import TestClient
+
+    import main
+    from auth import get_current_user
+
+    main.app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=7)
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+def _ids(body: str) -> list[int]:
+    return [int(line[4:]) for line in body.splitlines() if line.startswith("id: ")]
+
+
+def test_stream_resumes_from_last_event_id(client):
+    log = get_session_log()
+    log.create("s5", user_id=7)
+    for i in range(4):
+        log.append("s5", {"type": "result", "index": i})
+    log.finish("s5")
+
+    assert _ids(client.get("/stream/s5", headers={"Last-Event-ID": "2"}).text) == [3, 4]
+    assert _ids(client.get("/stream/s5", params={"since": 3}).text) == [4]
+    assert _ids(client.get("/stream/s5", headers={"Last-Event-ID": "junk"}).text) == [1, 2, 3, 4]
+
+
+def test_stream_is_private_to_the_session_owner(client):
+    get_session_log().create("s6", user_id=8)
+    assert client.get("/stream/s6").status_code == 404
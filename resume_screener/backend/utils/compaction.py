@@ -0,0 +1,228 @@
+import contextvars
+import functools
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+from utils.prescreen import tokenize
+
+# ── Token Budgets ─────────────────────────
+# Resumes and JDs are cleaned up and, if still too long, cut down to a token
+# budget before they are put in a prompt, which bounds latency and cost per
+# call. The resume budget can differ per plan.
+RESUME_TOKEN_BUDGET = int(os.getenv("RESUME_TOKEN_BUDGET", "6000"))
+JD_TOKEN_BUDGET = int(os.getenv("JD_TOKEN_BUDGET", "3000"))
+# e.g. "free:3000,pro:8000,unlimited:12000"; unlisted plans use RESUME_TOKEN_BUDGET
+PLAN_TOKEN_BUDGETS = {
+    plan: int(budget)
+    for plan, _, budget in (pair.partition(":") for pair in os.getenv("PLAN_TOKEN_BUDGETS", "").split(","))
+    if budget
+}
+
+# Resume budget for the current request or job; set by request handlers /
+# jobs and inherited by every task they spawn (like limiter_key)
+resume_token_budget: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "resume_token_budget", default=RESUME_TOKEN_BUDGET
+)
+
+TRUNCATION_NOTE = "[... trimmed to fit the token budget ...]"
+
+
+def budget_for_plan(plan_type: Optional[str]) -> int:
+    return PLAN_TOKEN_BUDGETS.get(plan_type or "", RESUME_TOKEN_BUDGET)
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken's cl100k_base, or None if tiktoken or its vocabulary file is unavailable."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def warm_encoding() -> bool:
+    """
+    Load the tokenizer now (the first load may download its vocabulary) so
+    no request pays for it; blocking, call it at startup. False if it is
+    unavailable and counts are estimated.
+    """
+    return _encoding() is not None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of `text`. cl100k_base isn't Gemini's tokenizer, but it is
+    within a few percent for English prose; falls back to ~4 chars/token.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# ── Cleanup ───────────────────────────────
+_SPACES_RE = re.compile(r"[ \t\f\v ]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_DIGITS_RE = re.compile(r"\d+")
+_PAGE_NUMBER_RE = re.compile(r"^(page\s*)?#(\s*(of|/)\s*#)?$", re.IGNORECASE)
+# A line seen this often is a running header/footer rather than content
+REPEATED_LINE_MIN = 3
+
+
+def clean_text(text: str) -> str:
+    """
+    Collapse whitespace runs, drop page numbers and keep only the first
+    occurrence of lines repeated on every page (headers, footers,
+    confidentiality notices). Idempotent.
+    """
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in (text or "").splitlines()]
+    # Footers like "Jane Doe - Page 3" differ only in the page number
+    shapes = [
+        _DIGITS_RE.sub("#", line.lower()) if "page" in line.lower() else line.lower()
+        for line in lines
+    ]
+    counts = Counter(shape for shape in shapes if len(shape) >= 3)
+
+    kept, seen = [], set()
+    for line, shape in zip(lines, shapes):
+        if _PAGE_NUMBER_RE.match(shape):
+            continue
+        if counts.get(shape, 0) >= REPEATED_LINE_MIN:
+            if shape in seen:
+                continue
+            seen.add(shape)
+        kept.append(line)
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(kept)).strip()
+
+
+# ── Sections ──────────────────────────────
+_HEADINGS = {
+    # heading keyword -> prior weight when choosing what to keep
+    "summary": 2, "profile": 2, "objective": 1, "skills": 3, "technical skills": 3, "core competencies": 3,
+    "experience": 3, "work experience": 3, "professional experience": 3, "employment": 3, "work history": 3,
+    "projects": 2, "education": 2, "certifications": 2, "certificates": 2, "achievements": 1, "awards": 1,
+    "publications": 1, "languages": 1, "volunteer": 0, "activities": 0, "courses": 1, "training": 1,
+    "interests": -1, "hobbies": -1, "references": -2, "declaration": -2, "personal details": -2,
+}
+_HEADING_RE = re.compile(r"^[A-Za-z][A-Za-z &/-]{1,40}:?$")
+
+
+def _heading_weight(line: str) -> Optional[int]:
+    """Prior weight if `line` looks like a section heading, else None."""
+    if not _HEADING_RE.match(line):
+        return None
+    key = line.rstrip(":").strip().lower()
+    if key in _HEADINGS:
+        return _HEADINGS[key]
+    if line.isupper() and len(line.split()) <= 4:
+        return 0
+    return None
+
+
+def _sections(text: str) -> list[tuple[int, list[str]]]:
+    """Split into (prior weight, lines) sections; the first is the contact/header block."""
+    sections: list[tuple[int, list[str]]] = [(10, [])]
+    for line in text.split("\n"):
+        weight = _heading_weight(line)
+        if weight is not None:
+            sections.append((weight, [line]))
+        else:
+            sections[-1][1].append(line)
+    return [s for s in sections if s[1]]
+
+
+def _take_lines(lines: list[str], budget: int) -> list[str]:
+    """Leading lines of a section that fit in `budget` tokens."""
+    taken, used = [], 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        taken.append(line)
+        used += cost
+    return taken
+
+
+def compact_resume(text: str, job_description: str, budget: int) -> str:
+    """
+    Clean a resume and, if it's still over `budget` tokens, keep the
+    sections most relevant to the JD (heading priors plus JD keyword hits),
+    in their original order. Sections that don't fit whole are cut at a
+    line boundary or dropped.
+    """
+    text = clean_text(text)
+    if count_tokens(text) <= budget:
+        return text
+
+    jd_terms = set(tokenize(job_description))
+    sections = _sections(text)
+    budget -= count_tokens(TRUNCATION_NOTE) + 1
+
+    def relevance(index: int) -> float:
+        weight, lines = sections[index]
+        words = tokenize(" ".join(lines))
+        hits = sum(1 for w in words if w in jd_terms)
+        return weight + 10 * hits / (len(words) + 20)
+
+    # Whole sections first, most relevant first, so one long section can't
+    # crowd out the short ones; then whatever space is left goes to the
+    # leading lines of the sections that didn't fit
+    ranked = sorted(range(len(sections)), key=relevance, reverse=True)
+    kept: dict[int, list[str]] = {}
+    remaining = budget
+    for index in ranked:
+        cost = count_tokens("\n".join(sections[index][1])) + 1
+        if cost <= remaining:
+            kept[index] = sections[index][1]
+            remaining -= cost
+    for index in ranked:
+        if index in kept:
+            continue
+        partial = _take_lines(sections[index][1], remaining)
+        if partial:
+            kept[index] = partial
+            remaining -= sum(count_tokens(line) + 1 for line in partial)
+
+    body = "\n".join(line for index in sorted(kept) for line in kept[index])
+    return f"{body}\n{TRUNCATION_NOTE}"
+
+
+@functools.lru_cache(maxsize=256)
+def compact_jd(text: str, budget: int = JD_TOKEN_BUDGET) -> str:
+    """Clean a JD and keep its leading lines up to `budget` tokens (cached; a bulk job reuses one JD)."""
+    text = clean_text(text)
+    if count_tokens(text) <= budget:
+        return text
+    lines = _take_lines(text.split("\n"), budget - count_tokens(TRUNCATION_NOTE) - 1)
+    return "\n".join(lines + [TRUNCATION_NOTE])
+
+
+@functools.lru_cache(maxsize=256)
+def prepare_jd(text: str, budget: int = JD_TOKEN_BUDGET) -> tuple[str, dict]:
+    """
+    Compacted JD plus its before/after token counts. Cached, so a bulk job
+    compacts and counts its JD once rather than once per resume.
+    """
+    jd = compact_jd(text, budget)
+    return jd, {"jd_tokens": count_tokens(text), "jd_tokens_sent": count_tokens(jd)}
+
+
+def compact_inputs(
+    resume_text: str, job_description: str, jd_budget: int = JD_TOKEN_BUDGET
+) -> tuple[str, str, dict]:
+    """
+    Compacted (resume, JD) for a prompt under the current resume budget,
+    plus before/after token counts to report on the result.
+    """
+    jd, jd_report = prepare_jd(job_description, jd_budget)
+    resume = compact_resume(resume_text, jd, resume_token_budget.get())
+    report = {
+        "resume_tokens": count_tokens(resume_text),
+        "resume_tokens_sent": count_tokens(resume),
+        **jd_report,
+    }
+    return resume, jd, report
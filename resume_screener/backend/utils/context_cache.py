@@ -0,0 +1,193 @@
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import os
+from typing import AsyncGenerator, Optional
+
+from utils.compaction import count_tokens
+
+# ── Config ────────────────────────────────
+# "gemini" uses Gemini cached content, "stub" an in-process fake read by the
+# mock LLM provider (tests and load tests), "off" disables context caching.
+CONTEXT_CACHE_PROVIDER = os.getenv("CONTEXT_CACHE_PROVIDER", "gemini")
+# Gemini rejects cached content below a model-specific minimum size, and
+# caching tiny prefixes isn't worth the extra round-trip anyway
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", "3600"))  # seconds; safety net if a job never releases
+
+
+class GeminiContextCacheProvider:
+    """Creates and deletes Gemini cached content via the google-genai async client."""
+
+    def __init__(self):
+        from google import genai
+
+        self._client = genai.Client()
+
+    async def create(self, model: str, system_text: str, prefix_text: str, ttl: int) -> str:
+        from google.genai import types
+
+        cache = await self._client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_text,
+                contents=[types.Content(role="user", parts=[types.Part(text=prefix_text)])],
+                ttl=f"{ttl}s",
+            ),
+        )
+        return cache.name
+
+    async def delete(self, name: str):
+        await self._client.aio.caches.delete(name=name)
+
+
+class StubContextCacheProvider:
+    """In-process stand-in that records cache entries instead of calling Gemini; the mock model reads them."""
+
+    def __init__(self):
+        self.entries: dict[str, tuple[str, str, str]] = {}
+        self._ids = itertools.count(1)
+
+    async def create(self, model: str, system_text: str, prefix_text: str, ttl: int) -> str:
+        name = f"cachedContents/stub-{next(self._ids)}"
+        self.entries[name] = (model, system_text, prefix_text)
+        return name
+
+    async def delete(self, name: str):
+        self.entries.pop(name, None)
+
+
+class ContextCacheManager:
+    """
+    Reference-counted provider cache entries keyed by (model, prefix).
+    A bulk job acquires the entry for its JD (creating it on first use),
+    every call in the job reuses it, and the entry is deleted when the last
+    job using it releases it. Concurrent acquires of the same prefix share
+    a single create.
+    """
+
+    def __init__(self, provider, min_tokens: int = CONTEXT_CACHE_MIN_TOKENS, ttl: int = CONTEXT_CACHE_TTL):
+        self.provider = provider
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self._entries: dict[str, asyncio.Future] = {}
+        self._refs: dict[str, int] = {}
+        self._deleting: set[asyncio.Task] = set()
+        self.created = 0
+        self.reused = 0
+        self.deleted = 0
+        self.skipped = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(model: str, system_text: str, prefix_text: str) -> str:
+        return hashlib.sha256(f"{model}\0{system_text}\0{prefix_text}".encode("utf-8")).hexdigest()
+
+    async def acquire(self, model: str, system_text: str, prefix_text: str) -> tuple[str, Optional[str]]:
+        """Return (key, cache name); the name is None if caching was skipped or failed."""
+        key = self._key(model, system_text, prefix_text)
+        tokens = await asyncio.to_thread(lambda: count_tokens(system_text) + count_tokens(prefix_text))
+        if tokens < self.min_tokens:
+            self.skipped += 1
+            return key, None
+
+        self._refs[key] = self._refs.get(key, 0) + 1
+        entry = self._entries.get(key)
+        try:
+            if entry is None:
+                entry = asyncio.get_running_loop().create_future()
+                self._entries[key] = entry
+                try:
+                    name = await self.provider.create(model, system_text, prefix_text, self.ttl)
+                    self.created += 1
+                except Exception:
+                    name = None
+                    self.errors += 1
+                entry.set_result(name)
+            else:
+                name = await asyncio.shield(entry)
+                if name is not None:
+                    self.reused += 1
+        except BaseException:
+            # Cancelled while creating or waiting: the other acquirers go
+            # uncached rather than wait forever, the next acquire retries
+            # the create, and our reference is given back
+            if not entry.done():
+                entry.set_result(None)
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            name = self._unref(key)
+            if name is not None:
+                task = asyncio.get_running_loop().create_task(self._delete(name))
+                self._deleting.add(task)
+                task.add_done_callback(self._deleting.discard)
+            raise
+        return key, name
+
+    def _unref(self, key: str) -> Optional[str]:
+        """Drop one reference; returns the cache name to delete if it was the last."""
+        refs = self._refs.get(key, 0) - 1
+        if refs > 0:
+            self._refs[key] = refs
+            return None
+        self._refs.pop(key, None)
+        entry = self._entries.pop(key, None)
+        if entry is None or not entry.done():
+            return None
+        return entry.result()
+
+    async def _delete(self, name: str):
+        try:
+            await self.provider.delete(name)
+            self.deleted += 1
+        except Exception:
+            # Entry expires on its own after the TTL
+            self.errors += 1
+
+    async def release(self, key: str):
+        name = self._unref(key)
+        if name is not None:
+            await self._delete(name)
+
+    @contextlib.asynccontextmanager
+    async def session(self, model: str, system_text: str, prefix_text: str) -> AsyncGenerator[Optional[str], None]:
+        """Hold a cache entry for the duration of a job; yields its name or None."""
+        key, name = await self.acquire(model, system_text, prefix_text)
+        try:
+            yield name
+        finally:
+            # Skipped prefixes never took a reference
+            if key in self._refs:
+                await self.release(key)
+
+    def stats(self) -> dict:
+        return {
+            "provider": type(self.provider).__name__ if self.provider else None,
+            "active": len(self._entries),
+            "created": self.created,
+            "reused": self.reused,
+            "deleted": self.deleted,
+            "skipped": self.skipped,
+            "errors": self.errors,
+        }
+
+
+_manager: Optional[ContextCacheManager] = None
+
+
+def get_context_cache() -> ContextCacheManager:
+    """Process-wide context cache manager for the configured provider."""
+    global _manager
+    if _manager is None:
+        provider = None
+        if CONTEXT_CACHE_PROVIDER == "gemini":
+            try:
+                provider = GeminiContextCacheProvider()
+            except Exception:
+                provider = None
+        elif CONTEXT_CACHE_PROVIDER == "stub":
+            provider = StubContextCacheProvider()
+        # With no provider every acquire is skipped
+        _manager = ContextCacheManager(provider, min_tokens=CONTEXT_CACHE_MIN_TOKENS if provider else 1 << 62)
+    return _manager
@@ -9,7 +9,7 @@ def generate_csv(results: list[dict]) -> bytes:
     
     # Header
     writer.writerow([
-        "Rank", "Filename", "Score", "Matching Skills", "Missing Skills", "Summary"
+        "Rank", "Filename", "Score", "Matching Skills", "Missing Skills", "Summary", "Duplicate Of"
     ])
     
     # Sort by score descending and assign rank
@@ -23,6 +23,7 @@ def generate_csv(results: list[dict]) -> bytes:
             ", ".join(r.get("matching_skills", [])),
             ", ".join(r.get("missing_skills", [])),
             r.get("summary", ""),
+            r.get("duplicate_of", ""),
         ])
     
     return output.getvalue().encode("utf-8")
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import re
+from typing import Optional
+
+from utils.prescreen import tokenize
+
+# ── Duplicate Detection ───────────────────
+# Exact duplicates are found by SHA-256 of the raw PDF bytes (before parsing)
+# and of the normalized extracted text (same resume, different file). Near
+# duplicates (re-exported or lightly edited copies) are optional and use a
+# 64-bit SimHash over word pairs: resumes within DEDUP_SIMHASH_DISTANCE bits
+# of each other are treated as the same.
+DEDUP_SIMHASH_DISTANCE = int(os.getenv("DEDUP_SIMHASH_DISTANCE", "3"))
+# Band width for the SimHash index; any two hashes within the distance share
+# at least one band exactly as long as 64 / SIMHASH_BAND_BITS > distance
+SIMHASH_BAND_BITS = 16
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text with punctuation and whitespace runs collapsed to single spaces."""
+    return _NON_WORD_RE.sub(" ", (text or "").lower()).strip()
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a document's keyword pairs."""
+    tokens = tokenize(text)
+    features = [f"{a} {b}" for a, b in zip(tokens, tokens[1:])] or tokens
+    weights = [0] * 64
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+class Deduplicator:
+    """
+    Tracks the resumes seen in one bulk job. Each unique resume becomes the
+    representative of its group; later copies are reported as duplicates
+    of it and don't need to be scored.
+    """
+
+    def __init__(self, near: bool = False, max_distance: int = DEDUP_SIMHASH_DISTANCE):
+        self.near = near
+        self.max_distance = max_distance
+        self._by_bytes: dict[str, str] = {}
+        self._by_text: dict[str, str] = {}
+        self._bands: dict[tuple[int, int], list[tuple[int, str]]] = {}
+        self.duplicates = 0
+
+    def match_bytes(self, digest: str) -> Optional[str]:
+        """Representative for byte-identical content seen before, if any (lets callers skip parsing)."""
+        rep = self._by_bytes.get(digest)
+        if rep is not None:
+            self.duplicates += 1
+        return rep
+
+    def check(self, filename: str, text: str, byte_digest: Optional[str] = None) -> Optional[str]:
+        """
+        Return the representative filename if this resume duplicates one seen
+        before; otherwise register it as a representative and return None.
+        Representative filenames must be unique within the job.
+        """
+        digest = text_digest(text)
+        rep = self._by_text.get(digest)
+        fingerprint = None
+        if rep is None and self.near:
+            fingerprint = simhash(text)
+            rep = self._near_match(fingerprint)
+        if rep is not None:
+            self.duplicates += 1
+            if byte_digest:
+                self._by_bytes.setdefault(byte_digest, rep)
+            return rep
+
+        self._by_text[digest] = filename
+        if byte_digest:
+            self._by_bytes[byte_digest] = filename
+        if self.near:
+            for band in self._band_keys(fingerprint):
+                self._bands.setdefault(band, []).append((fingerprint, filename))
+        return None
+
+    @staticmethod
+    def _band_keys(fingerprint: int) -> list[tuple[int, int]]:
+        mask = (1 << SIMHASH_BAND_BITS) - 1
+        return [(i, fingerprint >> (i * SIMHASH_BAND_BITS) & mask) for i in range(64 // SIMHASH_BAND_BITS)]
+
+    def _near_match(self, fingerprint: int) -> Optional[str]:
+        for band in self._band_keys(fingerprint):
+            for other, filename in self._bands.get(band, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return filename
+        return None
@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+# ── Config ────────────────────────────────
+JOB_QUEUE_PATH = os.getenv(
+    "JOB_QUEUE_PATH",
+    str(Path(__file__).resolve().parent.parent / "job_queue.db"),
+)
+# Uploads for queued jobs are spooled here so worker processes can read them
+JOB_SPOOL_DIR = os.getenv(
+    "JOB_SPOOL_DIR",
+    str(Path(__file__).resolve().parent.parent / "job_spool"),
+)
+# A running job whose worker hasn't heartbeated for this long is requeued
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "120"))  # seconds
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+class JobQueue:
+    """
+    Persistent job queue in SQLite, shared by web workers (which submit) and
+    worker processes (which claim and run). Claiming is fair across users:
+    the next job goes to the user with the fewest jobs currently running,
+    oldest job first within a user.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " user_id INTEGER NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"  # queued, running, done, failed
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " heartbeat_at REAL,"
+            " finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def submit(self, user_id: int, kind: str, payload: dict, job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, user_id, kind, payload, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, user_id, kind, json.dumps(payload), time.time()),
+            )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """Atomically take the next job for `worker`, or None if the queue is empty."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT j.id, j.user_id, j.kind, j.payload, j.attempts FROM jobs j"
+                    " WHERE j.status = 'queued'"
+                    " ORDER BY (SELECT COUNT(*) FROM jobs r WHERE r.user_id = j.user_id AND r.status = 'running'),"
+                    " j.created_at"
+                    " LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+                        " started_at = ?, heartbeat_at = ? WHERE id = ?",
+                        (worker, now, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "user_id": row[1], "kind": row[2], "payload": json.loads(row[3]), "attempts": row[4] + 1}
+
+    def heartbeat(self, job_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def complete(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ? WHERE id = ?", (time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def requeue_stale(
+        self, stale_after: int = JOB_STALE_AFTER, max_attempts: int = JOB_MAX_ATTEMPTS
+    ) -> tuple[int, list[dict]]:
+        """
+        Return jobs from dead workers to the queue, failing those that have
+        used up their attempts. Returns (number requeued, jobs failed); the
+        caller cleans up after the failed ones (credits, spooled files).
+        """
+        cutoff = time.time() - stale_after
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                abandoned = self._conn.execute(
+                    "SELECT id, user_id, kind, payload, attempts FROM jobs"
+                    " WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                    (cutoff, max_attempts),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'failed', error = 'worker lost too many times', finished_at = ?"
+                    " WHERE id = ?",
+                    [(time.time(), row[0]) for row in abandoned],
+                )
+                cur = self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL"
+                    " WHERE status = 'running' AND heartbeat_at < ?",
+                    (cutoff,),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        failed = [
+            {"id": row[0], "user_id": row[1], "kind": row[2], "payload": json.loads(row[3]), "attempts": row[4]}
+            for row in abandoned
+        ]
+        return cur.rowcount, failed
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, user_id, kind, status, attempts, error, created_at, started_at, finished_at"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "user_id", "kind", "status", "attempts", "error", "created_at", "started_at", "finished_at")
+        return dict(zip(keys, row))
+
+    def position(self, job_id: str) -> int:
+        """Number of queued jobs ahead of this one (0 once it is running)."""
+        with self._lock:
+            (ahead,) = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+                " AND created_at < (SELECT created_at FROM jobs WHERE id = ? AND status = 'queued')",
+                (job_id,),
+            ).fetchone()
+        return ahead
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue handle, opened lazily on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(JOB_QUEUE_PATH)
+    return _queue
@@ -0,0 +1,223 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import aiohttp
+from jwt.algorithms import RSAAlgorithm
+
+logger = logging.getLogger(__name__)
+
+# ── Config ────────────────────────────────
+JWKS_TTL = int(os.getenv("JWKS_TTL", "3600"))  # seconds between background refreshes
+JWKS_RETRY_INTERVAL = int(os.getenv("JWKS_RETRY_INTERVAL", "30"))  # after a failed refresh
+# An unknown kid triggers a refetch at most this often, so tokens with made-up
+# kids can't turn into a stream of requests to the identity provider
+JWKS_MIN_REFETCH_INTERVAL = float(os.getenv("JWKS_MIN_REFETCH_INTERVAL", "30"))
+JWKS_FETCH_TIMEOUT = float(os.getenv("JWKS_FETCH_TIMEOUT", "5"))
+# Requests that miss while another request's refetch is running wait this
+# long for it, then fail instead of queueing up behind a slow provider
+JWKS_MISS_WAIT = float(os.getenv("JWKS_MISS_WAIT", "1"))
+
+
+class JwksManager:
+    """
+    Signing keys kept in memory as parsed public keys by kid, so verifying
+    a token doesn't rebuild its key each time. Loaded when the app starts,
+    refreshed in the background every `ttl` seconds, and refetched early when
+    a token names a kid we don't have (key rotation). Concurrent refetches
+    are coalesced into one request; a failed fetch keeps the previous keys.
+
+    Lookups never do I/O except on a kid miss. The refresh task runs on the
+    app's event loop; sync callers (FastAPI threadpool dependencies) wait for
+    it from their worker thread. The refetch rate limit holds even with no
+    keys at all (the startup fetch failed): one miss refetches, concurrent
+    misses wait briefly for it, and the rest fail fast until it's due again.
+    """
+
+    def __init__(
+        self,
+        sources: list[tuple[str, dict]],
+        ttl: int = JWKS_TTL,
+        retry_interval: int = JWKS_RETRY_INTERVAL,
+        min_refetch_interval: float = JWKS_MIN_REFETCH_INTERVAL,
+        timeout: float = JWKS_FETCH_TIMEOUT,
+        miss_wait: float = JWKS_MISS_WAIT,
+    ):
+        self.sources = sources  # (url, headers), tried in order
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self.miss_wait = miss_wait
+        self._keys: dict[str, object] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._thread_lock = threading.Lock()
+        self._pending: Optional[concurrent.futures.Future] = None  # refetch started by a lookup
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.kid_misses = 0
+
+    # ── Fetching ──
+    async def _fetch(self) -> list[dict]:
+        error: Optional[Exception] = None
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            for url, headers in self.sources:
+                try:
+                    async with session.get(url, headers=headers) as response:
+                        response.raise_for_status()
+                        jwks = await response.json(content_type=None)
+                    return jwks["keys"]
+                except Exception as e:
+                    logger.warning(f"Failed to fetch JWKS from {url}: {e}")
+                    error = e
+        raise error or ValueError("No JWKS source configured")
+
+    async def _refresh_once(self) -> bool:
+        self._attempted_at = time.monotonic()
+        self.fetches += 1
+        try:
+            jwks = await self._fetch()
+        except Exception:
+            self.fetch_errors += 1
+            return False
+        keys = {}
+        for jwk in jwks:
+            try:
+                keys[jwk["kid"]] = RSAAlgorithm.from_jwk(jwk)
+            except Exception as e:
+                logger.warning(f"Skipping unusable JWK {jwk.get('kid')}: {e}")
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        return True
+
+    async def refresh(self) -> bool:
+        """Fetch the key set now, joining a fetch already in flight. False if it failed."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh_once())
+        return await asyncio.shield(self._inflight)
+
+    # ── Lifecycle ──
+    async def start(self):
+        """Load the keys (a failure is retried in the background) and start the refresh loop."""
+        self._loop = asyncio.get_running_loop()
+        await self.refresh()
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        self._loop = None
+
+    async def _refresh_loop(self):
+        while True:
+            due = self.ttl if self._keys else self.retry_interval
+            await asyncio.sleep(max(self._fetched_at + due - time.monotonic(), self.retry_interval))
+            await self.refresh()
+
+    # ── Lookup ──
+    def get_key(self, kid: str) -> Optional[object]:
+        """The public key for `kid`, refetching the key set (rate-limited) if it's unknown."""
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        self.kid_misses += 1
+        started = False
+        with self._thread_lock:
+            if self._pending is None or self._pending.done():
+                self._pending = None
+                # Join a background refresh already running even if a
+                # refetch isn't due, since it costs no extra request
+                joining = self._inflight is not None and not self._inflight.done()
+                due = time.monotonic() - self._attempted_at >= self.min_refetch_interval
+                if kid not in self._keys and (due or joining):
+                    self._pending = self._refresh_from_thread()
+                    started = not joining
+            pending = self._pending
+        if pending is not None:
+            try:
+                pending.result(self.timeout * (len(self.sources) + 1) if started else self.miss_wait)
+            except concurrent.futures.TimeoutError:
+                pass
+            except Exception as e:
+                logger.warning(f"JWKS refetch failed: {e}")
+        return self._keys.get(kid)
+
+    def _refresh_from_thread(self) -> Optional[concurrent.futures.Future]:
+        """Start a refresh on the app's loop; returns its future, or None if it can't be waited on."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        loop = self._loop if self._loop is not None and self._loop.is_running() else running
+        if loop is None:
+            # Not started inside an app (scripts, tests): fetch on a private loop
+            asyncio.run(self._refresh_once())
+            return None
+        future = asyncio.run_coroutine_threadsafe(self.refresh(), loop)
+        if running is loop:
+            return None  # called on the loop itself: can't wait, the next request will see the keys
+        return future
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at else None,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "kid_misses": self.kid_misses,
+        }
+
+
+# ── Stub Server ───────────────────────────
+class StubJwksServer:
+    """
+    Local JWKS endpoint for tests and load tests: serves `jwks` from a
+    background thread on 127.0.0.1 and counts requests. Point a manager
+    at `url` (or set JWKS_URL) and call `rotate` to simulate key rotation.
+    """
+
+    def __init__(self, jwks: dict, port: int = 0):
+        self.jwks = jwks
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.jwks).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}/.well-known/jwks.json"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def rotate(self, jwks: dict):
+        self.jwks = jwks
+
+    def __enter__(self) -> "StubJwksServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -1,9 +1,25 @@
 import asyncio
-from langchain_google_genai import ChatGoogleGenerativeAI
+import contextlib
+import functools
+import hashlib
+import os
+import threading
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
-from typing import List, Literal, AsyncGenerator
+from typing import List, Literal, AsyncGenerator, AsyncIterable, Awaitable, Callable, Iterable, Optional, Union
+
+from utils.score_cache import get_score_cache, make_key
+from utils.rate_limiter import get_limiter
+from utils.resilience import deadline_call, parse_llm_json, resilient_call
+from utils.context_cache import get_context_cache
+from utils.compaction import (
+    JD_TOKEN_BUDGET, compact_inputs, compact_resume, count_tokens, prepare_jd, resume_token_budget,
+)
+from utils.llm_providers import (
+    MOCK_LLM_MODEL, OPENAI_MODEL, build_chat_model, current_provider, supports_context_cache,
+)
 
 
 class ResumeScore(BaseModel):
@@ -15,53 +31,402 @@ class ResumeScore(BaseModel):
     summary: str = Field(description="Brief analysis of the candidate's suitability")
 
 
-def _build_chain():
+class BatchResumeScore(ResumeScore):
+    resume_id: str = Field(description="The ID of the resume this score belongs to, exactly as given (e.g. 'R1')")
+
+
+class BatchScores(BaseModel):
+    results: List[BatchResumeScore] = Field(description="One score object per resume, in any order")
+
+
+# ── Chain Registry ────────────────────────
+# Building a chain creates a new provider client (and HTTP connection pool),
+# parser and prompt, so chains are built once per (provider, model,
+# temperature) and shared by every request in the process.
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+DEFAULT_TEMPERATURE = float(os.getenv("GEMINI_TEMPERATURE", "0"))
+
+_INSTRUCTIONS = (
+    "1. Compare the resume with the job description carefully.\n"
+    "2. Provide a match score (0-100).\n"
+    "3. Provide a verdict: 'Shortlisted' (score >= 70), 'Maybe' (score 50-69), or 'Rejected' (score < 50).\n"
+    "4. Provide a clear, specific REASON explaining why this candidate was shortlisted, maybe, or rejected. "
+    "For rejected candidates, state exactly what critical skills/experience they lack. "
+    "For shortlisted candidates, state what makes them a strong match.\n"
+    "5. List matching skills and missing skills.\n"
+    "6. Write a brief summary of the candidate's overall suitability.\n"
+)
+SYSTEM_TEMPLATE = (
+    "You are an expert HR recruiter screening resumes against a job description.\n\n"
+    "INSTRUCTIONS:\n" + _INSTRUCTIONS + "\n"
+    "{format_instructions}"
+)
+# Several resumes against one JD in a single call (see "Batched Scoring" below)
+BATCH_SYSTEM_TEMPLATE = (
+    "You are an expert HR recruiter screening several resumes against the same job description.\n\n"
+    "INSTRUCTIONS (apply to EACH resume independently):\n" + _INSTRUCTIONS +
+    "7. Return exactly one result per resume, tagged with its resume_id.\n\n"
+    "{format_instructions}"
+)
+JD_BLOCK = "Job Description:\n{job_description}"
+RESUME_BLOCK = "Resume:\n{resume_text}"
+RESUMES_BLOCK = "Resumes:\n{resumes}"
+
+# Messages are laid out as [system instructions] [stable block] [per-item block].
+# The stable block is the JD in bulk mode and the resume in reverse mode, so
+# everything before the per-item block is identical for every call in a job
+# and can be served from the provider's context cache (utils/context_cache).
+PROMPT_TEMPLATE = "\n\n".join((SYSTEM_TEMPLATE, JD_BLOCK, RESUME_BLOCK))
+BATCH_PROMPT_TEMPLATE = "\n\n".join((BATCH_SYSTEM_TEMPLATE, JD_BLOCK, RESUMES_BLOCK))
+
+# Changes whenever the prompt wording changes, so cached scores never outlive it
+PROMPT_VERSION = hashlib.sha256(PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+BATCH_PROMPT_VERSION = hashlib.sha256(BATCH_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+_llm_registry: dict[tuple[str, str, float], BaseChatModel] = {}
+_chain_registry: dict[tuple[str, str, float, bool, str], object] = {}
+# Chains bound to a provider cache entry, keyed by (provider, model, cache name, batch, stable)
+_cached_chain_registry: dict[tuple[str, str, str, bool, str], object] = {}
+_chain_lock = threading.RLock()  # _build_chain re-enters via get_llm
+
+
+def _prompt_layout(batch: bool, stable: str) -> tuple[str, str, str]:
+    """(system template, stable block, per-item block) for a call shape. Batches are always JD-stable."""
+    if batch:
+        return BATCH_SYSTEM_TEMPLATE, JD_BLOCK, RESUMES_BLOCK
+    if stable == "resume_text":
+        return SYSTEM_TEMPLATE, RESUME_BLOCK, JD_BLOCK
+    return SYSTEM_TEMPLATE, JD_BLOCK, RESUME_BLOCK
+
+
+@functools.lru_cache(maxsize=None)
+def _format_instructions(batch: bool) -> str:
+    return JsonOutputParser(pydantic_object=BatchScores if batch else ResumeScore).get_format_instructions()
+
+
+def render_prefix(batch: bool, stable: str, value: str) -> tuple[str, str]:
+    """The cacheable part of a prompt: (system text, stable block text)."""
+    system, stable_block, _ = _prompt_layout(batch, stable)
+    return (
+        system.format(format_instructions=_format_instructions(batch)),
+        stable_block.format(**{stable: value}),
+    )
+
+
+def _route(provider: Optional[str] = None, model: Optional[str] = None) -> tuple[str, str]:
+    """(provider, model) for a call: the routed provider (utils/llm_providers) and its default model."""
+    provider = provider or current_provider()
+    if model:
+        return provider, model
+    if provider == "openai":
+        return provider, OPENAI_MODEL
+    if provider == "mock":
+        return provider, MOCK_LLM_MODEL
+    return provider, DEFAULT_MODEL
+
+
+def model_tag() -> str:
+    """Identifies the routed model in score-cache keys, so providers never share entries."""
+    provider, model = _route()
+    return model if provider == "gemini" else f"{provider}/{model}"
+
+
+def get_llm(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    provider: Optional[str] = None,
+) -> BaseChatModel:
+    """Return the shared chat client for (provider, model, temperature), creating it on first use."""
+    key = (*_route(provider, model), DEFAULT_TEMPERATURE if temperature is None else float(temperature))
+    llm = _llm_registry.get(key)
+    if llm is not None:
+        return llm
+
+    with _chain_lock:
+        llm = _llm_registry.get(key)
+        if llm is None:
+            llm = build_chat_model(*key)
+            _llm_registry[key] = llm
+        return llm
+
+
+def _build_chain(
+    provider: str,
+    model: str,
+    temperature: float = DEFAULT_TEMPERATURE,
+    batch: bool = False,
+    stable: str = "job_description",
+):
     """Build the LangChain scoring chain (reusable)."""
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
-    parser = JsonOutputParser(pydantic_object=ResumeScore)
-
-    prompt = ChatPromptTemplate.from_template(
-        "You are an expert HR recruiter screening resumes against a job description.\n\n"
-        "INSTRUCTIONS:\n"
-        "1. Compare the resume with the job description carefully.\n"
-        "2. Provide a match score (0-100).\n"
-        "3. Provide a verdict: 'Shortlisted' (score >= 70), 'Maybe' (score 50-69), or 'Rejected' (score < 50).\n"
-        "4. Provide a clear, specific REASON explaining why this candidate was shortlisted, maybe, or rejected. "
-        "For rejected candidates, state exactly what critical skills/experience they lack. "
-        "For shortlisted candidates, state what makes them a strong match.\n"
-        "5. List matching skills and missing skills.\n"
-        "6. Write a brief summary of the candidate's overall suitability.\n\n"
-        "Job Description:\n{job_description}\n\n"
-        "Resume:\n{resume_text}\n\n"
-        "{format_instructions}"
+    llm = get_llm(model, temperature, provider)
+    system, stable_block, item_block = _prompt_layout(batch, stable)
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system),
+        ("human", stable_block),
+        ("human", item_block),
+    ])
+    # Render the format instructions once instead of on every call
+    prompt = prompt.partial(format_instructions=_format_instructions(batch))
+
+    # The reply is parsed by _parse_reply rather than JsonOutputParser so
+    # that malformed JSON can be repaired (or re-asked) instead of failing
+    return prompt | llm
+
+
+def get_chain(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    batch: bool = False,
+    stable: str = "job_description",
+):
+    """Return the shared chain for the routed provider and (model, temperature), building it on first use."""
+    key = (
+        *_route(model=model),
+        DEFAULT_TEMPERATURE if temperature is None else float(temperature),
+        batch,
+        stable,
     )
+    chain = _chain_registry.get(key)
+    if chain is not None:
+        return chain
+
+    with _chain_lock:
+        chain = _chain_registry.get(key)
+        if chain is None:
+            chain = _build_chain(*key)
+            _chain_registry[key] = chain
+        return chain
 
-    return prompt | llm | parser, parser
 
+def get_cached_chain(cache_name: str, batch: bool = False, stable: str = "job_description"):
+    """
+    Chain that sends only the per-item block; the system instructions and
+    stable block come from the provider-side cached content `cache_name`.
+    Built once per cache entry and dropped when its context_cache_for ends.
+    """
+    key = (*_route(), cache_name, batch, stable)
+    chain = _cached_chain_registry.get(key)
+    if chain is not None:
+        return chain
+
+    with _chain_lock:
+        chain = _cached_chain_registry.get(key)
+        if chain is None:
+            _, _, item_block = _prompt_layout(batch, stable)
+            prompt = ChatPromptTemplate.from_messages([("human", item_block)])
+            chain = prompt | get_llm().bind(cached_content=cache_name)
+            _cached_chain_registry[key] = chain
+        return chain
 
-def score_resume(resume_text: str, job_description: str) -> dict:
-    """Scores a resume against a job description using Google Gemini (sync)."""
-    chain, parser = _build_chain()
 
-    result = chain.invoke({
+@contextlib.asynccontextmanager
+async def context_cache_for(value: str, batch: bool = False, stable: str = "job_description"):
+    """Hold a provider context-cache entry for a job's stable prompt prefix; yields its name or None."""
+    provider, model = _route()
+    if not supports_context_cache(provider):
+        yield None
+        return
+    system_text, prefix_text = render_prefix(batch, stable, value)
+    async with get_context_cache().session(model, system_text, prefix_text) as cache_name:
+        try:
+            yield cache_name
+        finally:
+            if cache_name is not None:
+                with _chain_lock:
+                    for key in [k for k in _cached_chain_registry if k[2] == cache_name]:
+                        del _cached_chain_registry[key]
+
+
+# compact_jd cuts at a line boundary, so a trimmed JD can land this far under its budget
+_JD_CUT_SLACK = 200
+
+
+def jd_budget(batch: bool = False) -> int:
+    """
+    JD token budget for a job. When the JD prefix can be context-cached,
+    a JD long enough to reach the cache's minimum size is never trimmed
+    below it; otherwise compaction would keep the cache from ever triggering.
+    """
+    provider, _ = _route()
+    cache = get_context_cache()
+    if not supports_context_cache(provider) or cache.provider is None:
+        return JD_TOKEN_BUDGET
+    system_text, block_text = render_prefix(batch, "job_description", "")
+    cacheable = cache.min_tokens - count_tokens(system_text) - count_tokens(block_text) + _JD_CUT_SLACK
+    return max(JD_TOKEN_BUDGET, cacheable)
+
+
+def set_default_model(model: str, temperature: Optional[float] = None):
+    """
+    Hot-swap the default Gemini scoring model without restarting the process.
+    Chains for the previous default are dropped; in-flight calls holding
+    a reference to them finish normally.
+    """
+    global DEFAULT_MODEL, DEFAULT_TEMPERATURE
+    with _chain_lock:
+        DEFAULT_MODEL = model
+        if temperature is not None:
+            DEFAULT_TEMPERATURE = float(temperature)
+        for key in [k for k in _chain_registry if k[0] == "gemini" and k[1] != model]:
+            del _chain_registry[key]
+        for key in [k for k in _llm_registry if k[0] == "gemini" and k[1] != model]:
+            del _llm_registry[key]
+        for key in [k for k in _cached_chain_registry if k[0] == "gemini" and k[1] != model]:
+            del _cached_chain_registry[key]
+
+
+def _parse_reply(message) -> dict:
+    """Extract the JSON object from a chat model reply (str or content parts)."""
+    content = message.content
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return parse_llm_json(content)
+
+
+async def _ainvoke_json(chain, inputs: dict, tokens: int) -> dict:
+    """
+    Invoke a chain and parse its JSON reply. Each attempt goes through the
+    shared limiter; once it holds a slot, the call runs under the deadline
+    and hedging of utils.resilience, which also retries failed attempts and
+    re-asks on bad JSON.
+    """
+    async def attempt() -> dict:
+        message = await get_limiter().call(
+            lambda: deadline_call(lambda: chain.ainvoke(inputs)), tokens=tokens
+        )
+        return _parse_reply(message)
+
+    return await resilient_call(attempt)
+
+
+async def ascore_resume(
+    resume_text: str,
+    job_description: str,
+    use_cache: bool = True,
+    context_cache: Optional[str] = None,
+    stable: str = "job_description",
+    jd_budget: int = JD_TOKEN_BUDGET,
+) -> dict:
+    """
+    Scores a resume against a job description using the routed LLM provider (native async).
+    `context_cache` is a provider cached-content name holding the prompt prefix
+    for `stable` (see context_cache_for); only the other block is then sent.
+    Both texts are compacted to their token budgets first, and the result
+    reports their token counts before and after.
+    """
+    # Compaction and tokenizing are CPU-bound; keep them off the event loop
+    resume_text, job_description, tokens = await asyncio.to_thread(
+        compact_inputs, resume_text, job_description, jd_budget
+    )
+    cache_key = make_key(resume_text, job_description, model_tag(), PROMPT_VERSION)
+    if use_cache:
+        cached = await get_score_cache().aget(cache_key)
+        if cached is not None:
+            cached["cached"] = True
+            cached["tokens"] = tokens
+            return cached
+
+    chain = get_cached_chain(context_cache, stable=stable) if context_cache else get_chain(stable=stable)
+    inputs = {
         "resume_text": resume_text,
         "job_description": job_description,
-        "format_instructions": parser.get_format_instructions()
-    })
+    }
 
+    result = await _ainvoke_json(
+        chain,
+        inputs,
+        tokens=_estimate_tokens(PROMPT_TEMPLATE) + tokens["resume_tokens_sent"] + tokens["jd_tokens_sent"],
+    )
+
+    await get_score_cache().aset(cache_key, result)
+    result["tokens"] = tokens
     return result
 
 
+# ── Async Scoring Engine ──────────────────
+# Calls are awaited directly on the event loop (no worker threads), and at
+# most `concurrency` tasks exist at once per job, so memory stays bounded no
+# matter how many items are queued. How many LLM calls actually run at once
+# across all jobs is decided by the process-wide limiter (utils/rate_limiter).
+DEFAULT_CONCURRENCY = int(os.getenv("SCORING_CONCURRENCY", "100"))
+
+
+_EXHAUSTED = object()
+
+
+async def _run_bounded(
+    items: Union[Iterable, AsyncIterable],
+    worker: Callable[..., Awaitable[dict]],
+    concurrency: int,
+) -> AsyncGenerator[dict, None]:
+    """
+    Run worker(*item) for each item with at most `concurrency` in flight, yielding as they complete.
+    `items` may be an async iterable (e.g. PDFs still being parsed); the next item is only
+    pulled when a slot is free, so a slow scorer applies backpressure to the producer.
+    """
+    if hasattr(items, "__aiter__"):
+        source = items.__aiter__()
+
+        async def _next():
+            try:
+                return await source.__anext__()
+            except StopAsyncIteration:
+                return _EXHAUSTED
+    else:
+        source = iter(items)
+
+        async def _next():
+            return next(source, _EXHAUSTED)
+
+    pending: set[asyncio.Task] = set()
+    fetch: Optional[asyncio.Task] = None
+    exhausted = False
+    try:
+        while True:
+            if fetch is None and not exhausted and len(pending) < concurrency:
+                fetch = asyncio.create_task(_next())
+            waiting = (pending | {fetch}) if fetch is not None else pending
+            if not waiting:
+                break
+
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if fetch in done:
+                done.discard(fetch)
+                item = fetch.result()
+                fetch = None
+                if item is _EXHAUSTED:
+                    exhausted = True
+                else:
+                    pending.add(asyncio.create_task(worker(*item)))
+
+            pending.difference_update(done)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if fetch is not None:
+            fetch.cancel()
+        if hasattr(source, "aclose"):
+            await source.aclose()
+
+
 async def async_score_resume(
     filename: str,
     resume_text: str,
     job_description: str,
-    semaphore: asyncio.Semaphore,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    use_cache: bool = True,
+    context_cache: Optional[str] = None,
+    jd_budget: int = JD_TOKEN_BUDGET,
 ) -> dict:
-    """Async wrapper for scoring a single resume with semaphore-bounded concurrency."""
-    async with semaphore:
+    """Score a single resume on the event loop, optionally bounded by a semaphore."""
+    async with semaphore or contextlib.nullcontext():
         try:
-            result = await asyncio.to_thread(score_resume, resume_text, job_description)
+            result = await ascore_resume(
+                resume_text, job_description, use_cache=use_cache, context_cache=context_cache, jd_budget=jd_budget
+            )
             result["filename"] = filename
             return result
         except Exception as e:
@@ -78,38 +443,194 @@ async def async_score_resume(
 
 
 async def bulk_score_resumes(
-    resumes: list[tuple[str, str]],
+    resumes: Union[Iterable[tuple[str, str]], AsyncIterable[tuple[str, str]]],
     job_description: str,
-    concurrency: int = 20,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    use_cache: bool = True,
+    batch_size: int = 1,
 ) -> AsyncGenerator[dict, None]:
     """
     Process multiple resumes concurrently against a single job description.
+    `resumes` may be an async iterable so scoring starts while uploads are still parsing.
+    With batch_size > 1, up to that many resumes share one LLM call (see async_score_batch).
     Yields results one-by-one as they complete.
     """
-    semaphore = asyncio.Semaphore(concurrency)
+    # The JD is compacted and counted once for the whole job (every call
+    # gets the same text back from prepare_jd's cache), and that prefix is
+    # cached provider-side until the job ends
+    budget = jd_budget(batch=batch_size > 1)
+    jd, jd_tokens = await asyncio.to_thread(prepare_jd, job_description, budget)
+    async with context_cache_for(jd, batch=batch_size > 1) as context_cache:
+        if batch_size > 1:
+            async for batch_results in _run_bounded(
+                _abatches(resumes, jd_tokens["jd_tokens_sent"], batch_size),
+                functools.partial(
+                    async_score_batch,
+                    job_description=job_description,
+                    use_cache=use_cache,
+                    context_cache=context_cache,
+                    jd_budget=budget,
+                ),
+                concurrency,
+            ):
+                for result in batch_results:
+                    yield result
+            return
+
+        async for result in _run_bounded(
+            resumes,
+            functools.partial(
+                async_score_resume,
+                job_description=job_description,
+                use_cache=use_cache,
+                context_cache=context_cache,
+                jd_budget=budget,
+            ),
+            concurrency,
+        ):
+            yield result
+
+
+# ── Batched Scoring ───────────────────────
+# Packs several resumes into one prompt so the JD and format instructions are
+# sent once per batch instead of once per resume. Batches are sized to fit an
+# input-token budget; anything the model fails to return (or a batch whose
+# output fails to parse) falls back to per-resume calls.
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "30000"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "10"))
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for batch sizing."""
+    return len(text) // 4 + 1
 
-    tasks = [
-        asyncio.create_task(
-            async_score_resume(filename, text, job_description, semaphore)
-        )
-        for filename, text in resumes
-    ]
 
-    for coro in asyncio.as_completed(tasks):
-        result = await coro
-        yield result
+async def _aiter(items: Union[Iterable, AsyncIterable]):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _abatches(
+    resumes: Union[Iterable[tuple[str, str]], AsyncIterable[tuple[str, str]]],
+    jd_tokens: int,
+    max_size: int,
+    token_budget: int = BATCH_TOKEN_BUDGET,
+) -> AsyncGenerator[tuple[list[tuple[str, str]]], None]:
+    """
+    Group resumes into batches of at most `max_size` that fit the input-token
+    budget. Each text is costed at no more than its compaction budget, since
+    that is all async_score_batch will send of it; `jd_tokens` is the
+    compacted JD's size.
+    """
+    base_tokens = _estimate_tokens(BATCH_PROMPT_TEMPLATE) + jd_tokens
+    resume_budget = resume_token_budget.get()
+    batch: list[tuple[str, str]] = []
+    used = base_tokens
+    async for filename, text in _aiter(resumes):
+        cost = min(_estimate_tokens(text), resume_budget)
+        if batch and (len(batch) >= max_size or used + cost > token_budget):
+            yield (batch,)
+            batch, used = [], base_tokens
+        batch.append((filename, text))
+        used += cost
+    if batch:
+        yield (batch,)
+
+
+def _format_batch(batch: list[tuple[str, str]]) -> str:
+    return "\n\n".join(
+        f"--- resume_id: R{i} (file: {filename}) ---\n{text}"
+        for i, (filename, text) in enumerate(batch, 1)
+    )
+
+
+async def async_score_batch(
+    batch: list[tuple[str, str]],
+    job_description: str,
+    use_cache: bool = True,
+    context_cache: Optional[str] = None,
+    jd_budget: int = JD_TOKEN_BUDGET,
+) -> list[dict]:
+    """Score a batch of (filename, resume_text) pairs with one LLM call, falling back per resume."""
+    results: list[dict] = []
+    todo: list[tuple[str, str]] = []
+    originals: dict[str, str] = {}
+    reports: dict[str, dict] = {}
+    jd, _ = await asyncio.to_thread(prepare_jd, job_description, jd_budget)
+    compacted = await asyncio.to_thread(
+        lambda: [compact_inputs(text, job_description, jd_budget) for _, text in batch]
+    )
+    for (filename, original), (text, _, reports[filename]) in zip(batch, compacted):
+        originals[filename] = original
+        cached = None
+        if use_cache:
+            cached = await get_score_cache().aget(make_key(text, jd, model_tag(), BATCH_PROMPT_VERSION))
+        if cached is not None:
+            cached["cached"] = True
+            cached["filename"] = filename
+            cached["tokens"] = reports[filename]
+            results.append(cached)
+        else:
+            todo.append((filename, text))
+
+    if len(todo) > 1:
+        try:
+            chain = get_cached_chain(context_cache, batch=True) if context_cache else get_chain(batch=True)
+            inputs = {
+                "job_description": jd,
+                "resumes": _format_batch(todo),
+            }
+            output = await _ainvoke_json(
+                chain,
+                inputs,
+                tokens=_estimate_tokens(BATCH_PROMPT_TEMPLATE)
+                + reports[todo[0][0]]["jd_tokens_sent"]
+                + _estimate_tokens(inputs["resumes"]),
+            )
+            by_id = {str(r.get("resume_id")): r for r in output.get("results", []) if isinstance(r, dict)}
+        except Exception:
+            by_id = {}
+
+        missing = []
+        for i, (filename, text) in enumerate(todo, 1):
+            try:
+                score = ResumeScore.model_validate(by_id[f"R{i}"]).model_dump()
+            except Exception:
+                missing.append((filename, text))
+                continue
+            await get_score_cache().aset(make_key(text, jd, model_tag(), BATCH_PROMPT_VERSION), score)
+            score["filename"] = filename
+            score["tokens"] = reports[filename]
+            results.append(score)
+        todo = missing
+
+    if todo:
+        # Fallback calls use the single-resume prompt, so they can't share the batch cache entry
+        results.extend(await asyncio.gather(*(
+            async_score_resume(filename, originals[filename], job_description, use_cache=use_cache, jd_budget=jd_budget)
+            for filename, _ in todo
+        )))
+    return results
 
 
 async def async_score_resume_against_jd(
     jd_filename: str,
     resume_text: str,
     jd_text: str,
-    semaphore: asyncio.Semaphore,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    use_cache: bool = True,
+    context_cache: Optional[str] = None,
 ) -> dict:
-    """Async wrapper for scoring a resume against a single JD (reverse mode)."""
-    async with semaphore:
+    """Score a resume against a single JD on the event loop (reverse mode)."""
+    async with semaphore or contextlib.nullcontext():
         try:
-            result = await asyncio.to_thread(score_resume, resume_text, jd_text)
+            result = await ascore_resume(
+                resume_text, jd_text, use_cache=use_cache, context_cache=context_cache, stable="resume_text"
+            )
             result["jd_filename"] = jd_filename
             return result
         except Exception as e:
@@ -128,21 +649,22 @@ async def async_score_resume_against_jd(
 async def bulk_score_resume_against_jds(
     resume_text: str,
     jd_pairs: list[tuple[str, str]],
-    concurrency: int = 20,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    use_cache: bool = True,
 ) -> AsyncGenerator[dict, None]:
     """
     Process one resume against multiple JDs concurrently (reverse mode).
     Yields results one-by-one as they complete.
     """
-    semaphore = asyncio.Semaphore(concurrency)
-
-    tasks = [
-        asyncio.create_task(
-            async_score_resume_against_jd(jd_filename, resume_text, jd_text, semaphore)
-        )
-        for jd_filename, jd_text in jd_pairs
-    ]
+    # The resume is the stable prefix here, so it's compacted once without
+    # ranking sections against any one JD; per-JD compaction leaves it as is
+    resume_text = await asyncio.to_thread(compact_resume, resume_text, "", resume_token_budget.get())
+    # The resume prefix is cached provider-side for the whole job, then released
+    async with context_cache_for(resume_text, stable="resume_text") as context_cache:
+        async def _score_jd(jd_filename: str, jd_text: str) -> dict:
+            return await async_score_resume_against_jd(
+                jd_filename, resume_text, jd_text, use_cache=use_cache, context_cache=context_cache
+            )
 
-    for coro in asyncio.as_completed(tasks):
-        result = await coro
-        yield result
+        async for result in _run_bounded(jd_pairs, _score_jd, concurrency):
+            yield result
@@ -0,0 +1,217 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from utils.context_cache import CONTEXT_CACHE_PROVIDER, get_context_cache
+from utils.prescreen import tokenize
+
+# ── Config ────────────────────────────────
+# "gemini" (Google Gemini), "openai" (any OpenAI-compatible endpoint) or
+# "mock" (in-process deterministic scorer for load and regression tests)
+PROVIDERS = ("gemini", "openai", "mock")
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+# Per-plan routing, e.g. "free:mock,unlimited:openai"; unlisted plans use LLM_PROVIDER
+LLM_PLAN_PROVIDERS = dict(
+    pair.split(":", 1) for pair in os.getenv("LLM_PLAN_PROVIDERS", "").split(",") if ":" in pair
+)
+# Providers a request may pick explicitly via its `provider` form field; empty disables overrides
+LLM_REQUEST_PROVIDERS = frozenset(p for p in os.getenv("LLM_REQUEST_PROVIDERS", "").split(",") if p)
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # vLLM, Ollama, LM Studio, ... (None = api.openai.com)
+
+MOCK_LLM_MODEL = "mock-scorer"
+# "fixed:<s>", "uniform:<lo>:<hi>" or "lognormal:<median>:<sigma>" (seconds)
+MOCK_LLM_LATENCY = os.getenv("MOCK_LLM_LATENCY", "lognormal:0.8:0.5")
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))  # network-style failures
+MOCK_LLM_THROTTLE_RATE = float(os.getenv("MOCK_LLM_THROTTLE_RATE", "0"))  # 429s
+MOCK_LLM_BAD_JSON_RATE = float(os.getenv("MOCK_LLM_BAD_JSON_RATE", "0"))  # truncated replies
+MOCK_LLM_SEED = os.getenv("MOCK_LLM_SEED")
+
+# Which provider the current request or job is routed to; set by request
+# handlers / jobs and inherited by every task they spawn (like limiter_key)
+llm_provider: contextvars.ContextVar[str] = contextvars.ContextVar("llm_provider", default="")
+
+
+def current_provider() -> str:
+    return llm_provider.get() or LLM_PROVIDER
+
+
+def resolve_provider(plan_type: Optional[str] = None, requested: Optional[str] = None) -> str:
+    """
+    Pick the provider for a request: an explicitly requested one (if allowed
+    by LLM_REQUEST_PROVIDERS), else the user's plan mapping, else the default.
+    Raises ValueError for a request that names a provider it may not use.
+    """
+    if requested:
+        if requested not in PROVIDERS or requested not in LLM_REQUEST_PROVIDERS:
+            raise ValueError(f"LLM provider '{requested}' is not available.")
+        return requested
+    return LLM_PLAN_PROVIDERS.get(plan_type or "", LLM_PROVIDER)
+
+
+# The LLM provider that can read each context-cache provider's entries: Gemini
+# cached content, or the stub's entries with the mock model
+_CONTEXT_CACHE_READERS = {"gemini": "gemini", "stub": "mock"}
+
+
+def supports_context_cache(provider: str) -> bool:
+    """True if `provider` can be sent entries of the configured context cache."""
+    return _CONTEXT_CACHE_READERS.get(CONTEXT_CACHE_PROVIDER) == provider
+
+
+def build_chat_model(provider: str, model: str, temperature: float) -> BaseChatModel:
+    """Create a chat model for a provider. Provider SDKs are imported on first use."""
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(model=model, temperature=temperature)
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(model=model, temperature=temperature, base_url=OPENAI_BASE_URL)
+    if provider == "mock":
+        return MockChatModel()
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+# ── Mock Provider ─────────────────────────
+
+class MockProviderError(Exception):
+    """Injected failure; carries a status code like the real SDK errors."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_rng = random.Random(MOCK_LLM_SEED)
+
+_BATCH_ITEM_RE = re.compile(r"^--- resume_id: (\S+) \(file: .*?\) ---$", re.MULTILINE)
+
+
+def _mock_latency(spec: str) -> float:
+    kind, _, args = spec.partition(":")
+    params = [float(a) for a in args.split(":") if a]
+    if kind == "fixed":
+        return params[0]
+    if kind == "uniform":
+        return _rng.uniform(params[0], params[1])
+    if kind == "lognormal":
+        return _rng.lognormvariate(math.log(params[0]), params[1])
+    return 0.0
+
+
+def mock_score(resume_text: str, job_description: str) -> dict:
+    """
+    Deterministic ResumeScore-shaped result: the score is the share of JD
+    keywords (weighted by frequency) that appear in the resume.
+    """
+    jd_terms = Counter(tokenize(job_description))
+    resume_terms = set(tokenize(resume_text))
+    matching = [t for t, _ in jd_terms.most_common() if t in resume_terms]
+    missing = [t for t, _ in jd_terms.most_common() if t not in resume_terms]
+    covered = sum(jd_terms[t] for t in matching)
+    score = round(100 * covered / max(sum(jd_terms.values()), 1))
+    verdict = "Shortlisted" if score >= 70 else "Maybe" if score >= 50 else "Rejected"
+    return {
+        "score": score,
+        "verdict": verdict,
+        "reason": f"Covers {len(matching)} of {len(jd_terms)} job description keywords.",
+        "matching_skills": matching[:10],
+        "missing_skills": missing[:10],
+        "summary": f"Mock assessment ({hashlib.sha256(resume_text.encode('utf-8')).hexdigest()[:8]}).",
+    }
+
+
+def _mock_reply(messages: list[BaseMessage]) -> str:
+    """Answer a scoring prompt from its Job Description / Resume(s) blocks."""
+    blocks = {}
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else ""
+        label, _, body = content.partition(":\n")
+        blocks[label] = body
+
+    jd = blocks.get("Job Description", "")
+    if "Resumes" in blocks:
+        parts = _BATCH_ITEM_RE.split(blocks["Resumes"])
+        results = [
+            {"resume_id": resume_id, **mock_score(text, jd)}
+            for resume_id, text in zip(parts[1::2], parts[2::2])
+        ]
+        return json.dumps({"results": results})
+    return json.dumps(mock_score(blocks.get("Resume", ""), jd))
+
+
+def _cached_prefix(name: str) -> Optional[list[BaseMessage]]:
+    """The system and stable-block messages a stub context-cache entry holds, or None if it doesn't exist."""
+    entry = getattr(get_context_cache().provider, "entries", {}).get(name)
+    if entry is None:
+        return None
+    _, system_text, prefix_text = entry
+    return [SystemMessage(content=system_text), HumanMessage(content=prefix_text)]
+
+
+class MockChatModel(BaseChatModel):
+    """
+    Local stand-in for a chat model. Replies are valid scoring JSON derived
+    from the prompt, so runs are reproducible; latency and failures are
+    drawn from the configured distributions (seed with MOCK_LLM_SEED).
+    Accepts `cached_content` naming a stub context-cache entry, like
+    Gemini's cached content, and reads the prompt prefix from it.
+    """
+
+    latency: str = MOCK_LLM_LATENCY
+    error_rate: float = MOCK_LLM_ERROR_RATE
+    throttle_rate: float = MOCK_LLM_THROTTLE_RATE
+    bad_json_rate: float = MOCK_LLM_BAD_JSON_RATE
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock"
+
+    def _outcome(
+        self, messages: list[BaseMessage], cached_content: Optional[str] = None
+    ) -> tuple[float, Optional[Exception], str]:
+        """(delay, injected error or None, reply text) for one call."""
+        delay = _mock_latency(self.latency)
+        if cached_content:
+            prefix = _cached_prefix(cached_content)
+            if prefix is None:
+                return delay, MockProviderError(f"404 {cached_content} not found (mock)", status_code=404), ""
+            messages = prefix + list(messages)
+        roll = _rng.random()
+        if roll < self.throttle_rate:
+            return delay, MockProviderError("429 RESOURCE_EXHAUSTED (mock)", status_code=429), ""
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, ConnectionError("Connection reset (mock)"), ""
+        reply = _mock_reply(messages)
+        if roll < self.throttle_rate + self.error_rate + self.bad_json_rate:
+            reply = reply[: len(reply) // 2]
+        return delay, None, reply
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        delay, error, reply = self._outcome(messages, kwargs.get("cached_content"))
+        time.sleep(delay)
+        if error:
+            raise error
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        delay, error, reply = self._outcome(messages, kwargs.get("cached_content"))
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
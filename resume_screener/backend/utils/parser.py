@@ -1,46 +1,402 @@
-import PyPDF2
-import io
+import asyncio
+import os
+import signal
+import tempfile
+import threading
 import zipfile
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncGenerator, Optional
 
+from utils.pdf_engine import PdfText, available_backends, extract, extract_pages
+from utils.text_cache import get_text_cache, make_text_key
 
-def extract_text_from_pdf(file_content: bytes) -> str:
-    """Extracts text from a PDF file content."""
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() or ""
-    return text.strip()
+# ── Parsing Pool Config ───────────────────
+# PDF parsing is CPU-bound, so it runs in worker processes instead of on the
+# event loop; handlers await the async helpers below.
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARSE_TIMEOUT = float(os.getenv("PDF_PARSE_TIMEOUT", "30"))  # seconds per pool task
+# A worker still busy this long after its own timeout is stuck in native code
+# and can't be interrupted, so its pool is replaced and the processes killed
+PDF_PARSE_KILL_GRACE = float(os.getenv("PDF_PARSE_KILL_GRACE", "5"))  # seconds
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(20 * 1024 * 1024)))
+# Longer PDFs are split into page ranges of this size, extracted in parallel
+PDF_SPLIT_PAGES = int(os.getenv("PDF_SPLIT_PAGES", "16"))
+# How often a task waiting in the pool's queue checks whether it has started
+PDF_QUEUE_POLL = 0.25  # seconds
+EMPTY_PDF_MESSAGE = "No extractable text (scanned or empty PDF)."
 
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
 
-def extract_pdfs_from_zip(zip_bytes: bytes) -> list[tuple[str, str]]:
+
+def extract_cached(file_content: bytes, max_pages: Optional[int] = None) -> PdfText:
+    """extract() behind the text cache; cache hits come back with backend "cache"."""
+    cache = get_text_cache()
+    key = make_text_key(file_content, max_pages)
+    hit = cache.get(key, len(file_content))
+    if hit is not None:
+        return hit._replace(backend="cache")
+    result = extract(file_content, max_pages)
+    cache.set(key, result)
+    return result
+
+
+def _iter_zip_pdf_names(zf: zipfile.ZipFile):
+    """Yield the PDF member names of a ZIP, skipping directories and hidden/macOS files."""
+    for name in zf.namelist():
+        if name.endswith("/") or name.startswith("__MACOSX") or name.startswith("."):
+            continue
+        if name.lower().endswith(".pdf"):
+            yield name
+
+
+# ── Async Parsing (process pool) ──────────
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Process-wide PDF parsing pool, started lazily on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS)
+    return _pool
+
+
+def shutdown_parse_pool():
+    """Stop the parsing workers (called on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _recycle_parse_pool(pool: ProcessPoolExecutor):
+    """
+    Replace `pool` with a fresh one and kill its processes. Other tasks that
+    were running in it fail with BrokenProcessPool and are retried by
+    _run_in_pool on the new pool.
+    """
+    global _pool, _pool_recycles
+    with _pool_lock:
+        if _pool is not pool:
+            return  # already replaced
+        _pool = None
+        _pool_recycles += 1
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False)
+    for process in processes:
+        process.terminate()
+
+
+def _with_deadline(seconds: float, fn, *args):
+    """
+    Pool task wrapper: run fn(*args), raising TimeoutError inside the worker
+    once it has run for `seconds`, so a pathological PDF frees its worker
+    instead of occupying it after the caller has given up.
+    """
+    if not hasattr(signal, "setitimer"):
+        return fn(*args)
+
+    def _expired(signum, frame):
+        raise TimeoutError(f"PDF parsing took longer than {seconds:g}s.")
+
+    previous = signal.signal(signal.SIGALRM, _expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _consume(future: asyncio.Future):
+    # Abandoned results (e.g. BrokenProcessPool after a recycle) aren't errors to log
+    if not future.cancelled():
+        future.exception()
+
+
+async def _await_task(pool: ProcessPoolExecutor, future: Future):
+    """
+    Wait for a pool task. Time spent queued behind other tasks doesn't
+    count; one still running well past its own in-worker timeout is stuck,
+    so its pool is recycled.
+    """
+    wrapped = asyncio.wrap_future(future)
+    # The executor marks a task running once it enters the call queue, where
+    # it can still wait for one task ahead of it to finish
+    limit = 2 * PDF_PARSE_TIMEOUT + PDF_PARSE_KILL_GRACE
+    try:
+        done = set()
+        while not done and not future.running():
+            done, _ = await asyncio.wait({wrapped}, timeout=PDF_QUEUE_POLL)
+        if not done:
+            done, _ = await asyncio.wait({wrapped}, timeout=limit)
+        if not done:
+            _recycle_parse_pool(pool)
+            raise asyncio.TimeoutError(f"PDF parsing took longer than {PDF_PARSE_TIMEOUT:g}s.")
+        return wrapped.result()
+    finally:
+        if not wrapped.done():
+            future.cancel()
+            wrapped.add_done_callback(_consume)
+
+
+async def _run_in_pool(fn, *args):
+    """
+    Run fn(*args) in the parsing pool under PDF_PARSE_TIMEOUT (enforced in
+    the worker; see _with_deadline and _await_task). A task lost because its
+    pool was recycled for someone else's stuck PDF is retried once.
+    """
+    for attempt in range(2):
+        pool = get_parse_pool()
+        try:
+            return await _await_task(pool, pool.submit(_with_deadline, PDF_PARSE_TIMEOUT, fn, *args))
+        except BrokenProcessPool:
+            _recycle_parse_pool(pool)
+            if attempt:
+                raise
+
+
+# Parses per backend that succeeded, and failures (pool workers report the
+# backend back with each result, so the counts live in this process)
+_parse_counts: Counter = Counter()
+_pool_recycles = 0
+
+
+def _record(result: Optional[PdfText]):
+    _parse_counts[result.backend if result is not None else "failed"] += 1
+
+
+def parse_stats() -> dict:
+    return {"available_backends": available_backends(), "parsed": dict(_parse_counts), "pool_recycles": _pool_recycles}
+
+
+async def _extract_split(file_content: bytes) -> PdfText:
+    """
+    Extract the first page range in the pool; if the document is longer,
+    fan the remaining ranges out to other workers using the same backend.
+    """
+    last = PDF_MAX_PAGES
+    first_stop = min(PDF_SPLIT_PAGES, last)
+    texts, backend, total = await _run_in_pool(extract_pages, file_content, 0, first_stop)
+
+    last = min(total, last)
+    if last > first_stop:
+        chunks = await asyncio.gather(*(
+            _run_in_pool(extract_pages, file_content, start, min(start + PDF_SPLIT_PAGES, last), backend)
+            for start in range(first_stop, last, PDF_SPLIT_PAGES)
+        ))
+        for chunk_texts, _, _ in chunks:
+            texts.extend(chunk_texts)
+    return PdfText("\n".join(texts).strip(), backend, total)
+
+
+async def aextract_pdf(file_content: bytes) -> PdfText:
+    """
+    Extracts text from PDF bytes in the parsing pool, recording the backend used.
+    Raises ValueError for files over PDF_MAX_BYTES and TimeoutError if a
+    page range takes longer than PDF_PARSE_TIMEOUT to parse.
+    """
+    if len(file_content) > PDF_MAX_BYTES:
+        raise ValueError(f"PDF exceeds the {PDF_MAX_BYTES // (1024 * 1024)} MB size limit.")
+
+    # Repeat uploads (the same JD or resume again) skip parsing entirely
+    cache = get_text_cache()
+    key = await asyncio.to_thread(make_text_key, file_content, PDF_MAX_PAGES)
+    hit = await asyncio.to_thread(cache.get, key, len(file_content))
+    if hit is not None:
+        result = hit._replace(backend="cache")
+        _record(result)
+        return result
+
+    try:
+        result = await _extract_split(file_content)
+    except Exception:
+        _record(None)
+        raise
+    _record(result)
+    await asyncio.to_thread(cache.set, key, result)
+    return result
+
+
+async def aextract_text_from_pdf(file_content: bytes) -> str:
+    """Extracts text from PDF bytes in the parsing pool (see aextract_pdf)."""
+    return (await aextract_pdf(file_content)).text
+
+
+# ── Disk-Spooled ZIP Ingestion ────────────
+# Uploads are copied to a temp file in fixed-size chunks and ZIPs are opened
+# from disk. Pool workers open the archive themselves and read one member
+# with a bounded buffer, so neither the archive nor its decompressed members
+# are ever held in the web worker's memory. Each worker keeps the archives
+# it is reading open, so a ZIP's central directory is parsed once per
+# worker instead of once per member.
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+ZIP_MAX_UPLOAD_BYTES = int(os.getenv("ZIP_MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "5000"))
+ZIP_MAX_TOTAL_BYTES = int(os.getenv("ZIP_MAX_TOTAL_BYTES", str(4 * 1024 * 1024 * 1024)))
+ZIP_MAX_RATIO = int(os.getenv("ZIP_MAX_RATIO", "100"))  # uncompressed / compressed
+ZIP_HANDLES_PER_WORKER = 4
+
+# Per pool worker process: (path, inode, size, mtime) -> open archive
+_open_zips: "OrderedDict[tuple, zipfile.ZipFile]" = OrderedDict()
+
+
+async def spool_upload(
+    upload,
+    max_bytes: int = ZIP_MAX_UPLOAD_BYTES,
+    suffix: str = ".zip",
+    directory: Optional[str] = None,
+) -> str:
+    """
+    Copy an UploadFile to a named temp file in chunks and return its path.
+    The caller owns the file and must delete it. Raises ValueError if the
+    upload is larger than `max_bytes`.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload_", dir=directory)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise ValueError(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit.")
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def _zip_pdf_members(zf: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    """
+    PDF members of an archive that pass the per-member limits.
+    Raises ValueError if the archive as a whole exceeds the member-count or
+    total decompressed-size caps (likely a ZIP bomb).
     """
-    Extracts all PDF files from a ZIP archive.
-    Returns a list of (filename, extracted_text) tuples.
+    infos = [zf.getinfo(name) for name in _iter_zip_pdf_names(zf)]
+    if len(infos) > ZIP_MAX_MEMBERS:
+        raise ValueError(f"ZIP contains more than {ZIP_MAX_MEMBERS} PDFs.")
+    if sum(info.file_size for info in infos) > ZIP_MAX_TOTAL_BYTES:
+        raise ValueError("ZIP decompressed size exceeds the allowed limit.")
+
+    members = []
+    for info in infos:
+        if info.file_size > PDF_MAX_BYTES:
+            continue
+        if info.compress_size and info.file_size / info.compress_size > ZIP_MAX_RATIO:
+            continue
+        members.append(info)
+    return members
+
+
+def count_zip_pdfs(zip_path: str) -> int:
+    """Number of PDFs in a ZIP that will be parsed (central directory only, no decompression)."""
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        return len(_zip_pdf_members(zf))
+
+
+def _open_zip(zip_path: str) -> zipfile.ZipFile:
     """
-    results = []
-    with zipfile.ZipFile(io.BytesIO(zip_bytes), "r") as zf:
-        for name in zf.namelist():
-            # Skip directories and hidden/macOS resource files
-            if name.endswith("/") or name.startswith("__MACOSX") or name.startswith("."):
-                continue
-            if name.lower().endswith(".pdf"):
-                pdf_bytes = zf.read(name)
-                try:
-                    text = extract_text_from_pdf(pdf_bytes)
-                    if text:  # Only include PDFs with extractable text
-                        # Use just the filename, not the full path inside ZIP
-                        filename = name.split("/")[-1]
-                        results.append((filename, text))
-                except Exception:
-                    # Skip corrupted PDFs
-                    pass
-    return results
+    This worker's open handle on `zip_path`, opening it on first use.
+    Keyed by file identity too, so a new upload reusing a path is reopened;
+    the least recently used handles (and any whose file is gone) are closed.
+    """
+    stat = os.stat(zip_path)
+    key = (zip_path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    zf = _open_zips.get(key)
+    if zf is not None:
+        _open_zips.move_to_end(key)
+        return zf
+    for stale in [k for k in _open_zips if not os.path.exists(k[0])]:
+        _open_zips.pop(stale).close()
+    zf = zipfile.ZipFile(zip_path, "r")
+    _open_zips[key] = zf
+    while len(_open_zips) > ZIP_HANDLES_PER_WORKER:
+        _, oldest = _open_zips.popitem(last=False)
+        oldest.close()
+    return zf
 
 
-def extract_jds_from_zip(zip_bytes: bytes) -> list[tuple[str, str]]:
+def _extract_zip_member(zip_path: str, info: zipfile.ZipInfo, max_pages: int, max_bytes: int) -> PdfText:
     """
-    Extracts all JD PDF files from a ZIP archive.
-    Returns a list of (filename, extracted_text) tuples.
+    Pool task: read one ZIP member with a bounded buffer and extract its text
+    through the text cache. Members aren't split by page range; the other
+    workers are busy with other members already.
     """
-    return extract_pdfs_from_zip(zip_bytes)
+    with _open_zip(zip_path).open(info) as member:
+        # Declared sizes can lie, so cap the actual decompressed read too
+        pdf_bytes = member.read(max_bytes + 1)
+    if len(pdf_bytes) > max_bytes:
+        raise ValueError("ZIP member exceeds the PDF size limit.")
+    return extract_cached(pdf_bytes, max_pages)
+
+
+async def _parse_zip_member(zip_path: str, info: zipfile.ZipInfo) -> tuple[str, str, Optional[str]]:
+    """Parse one ZIP member in the pool into (filename, text, error); see aiter_pdfs_from_zip."""
+    # Use just the filename, not the full path inside ZIP
+    filename = info.filename.split("/")[-1]
+    try:
+        result = await _run_in_pool(_extract_zip_member, zip_path, info, PDF_MAX_PAGES, PDF_MAX_BYTES)
+    except Exception as e:
+        _record(None)
+        return filename, "", str(e) or type(e).__name__
+    _record(result)
+    # The worker looked the member up in its own cache instance
+    get_text_cache().record_remote(result.backend == "cache", info.file_size)
+    if not result.text:
+        return filename, "", EMPTY_PDF_MESSAGE
+    return filename, result.text, None
+
+
+async def aiter_pdfs_from_zip(zip_path: str) -> AsyncGenerator[tuple[str, str, Optional[str]], None]:
+    """
+    Yield (filename, text, error) for each PDF in an on-disk ZIP as soon as
+    it is parsed. `error` says why a corrupted, oversized, timed-out or
+    empty PDF has no text, and is None otherwise. Keeps a window of parses
+    in flight so every pool worker stays busy, and only reads ahead while
+    the consumer keeps pulling (backpressure).
+    """
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        members = _zip_pdf_members(zf)
+    window = max(PDF_PARSE_WORKERS * 2, 1)
+    iterator = iter(members)
+    pending: set[asyncio.Task] = set()
+
+    def _fill():
+        for info in iterator:
+            pending.add(asyncio.create_task(_parse_zip_member(zip_path, info)))
+            if len(pending) >= window:
+                return
+
+    _fill()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+            _fill()
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def aextract_pdfs_from_zip(zip_path: str) -> list[tuple[str, str]]:
+    """
+    (filename, text) for every PDF in an on-disk ZIP, parsed in the pool
+    concurrently. Corrupted, oversized, timed-out or empty PDFs are skipped.
+    """
+    return [(fname, text) async for fname, text, error in aiter_pdfs_from_zip(zip_path) if error is None]
+
 
+async def aextract_jds_from_zip(zip_path: str) -> list[tuple[str, str]]:
+    """(filename, text) for every job description PDF in an on-disk ZIP (see aextract_pdfs_from_zip)."""
+    return await aextract_pdfs_from_zip(zip_path)
@@ -0,0 +1,104 @@
+import io
+import os
+from typing import Callable, NamedTuple, Optional
+
+# Fast native extractors are optional; PyPDF2 is always available
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF < 1.24
+    except ImportError:
+        pymupdf = None
+
+import PyPDF2
+
+# ── Extraction Engine ─────────────────────
+# Backends are tried in PDF_BACKENDS order; a backend that is not installed
+# is skipped and one that raises on a file falls through to the next, so
+# PyPDF2 (slowest, most forgiving of odd encodings) stays the last resort.
+PDF_BACKENDS = [b.strip() for b in os.getenv("PDF_BACKENDS", "pdfium,pymupdf,pypdf2").split(",") if b.strip()]
+
+
+class PdfText(NamedTuple):
+    text: str
+    backend: str
+    pages: int  # total pages in the document, not just the ones extracted
+
+
+def _pdfium_pages(data: bytes, start: int, stop: Optional[int]) -> tuple[list[str], int]:
+    pdf = pypdfium2.PdfDocument(data)
+    try:
+        total = len(pdf)
+        texts = []
+        for i in range(start, min(total, stop) if stop is not None else total):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            try:
+                # get_text_range() warns on every call in pypdfium2 4.x
+                texts.append(textpage.get_text_bounded())
+            finally:
+                textpage.close()
+                page.close()
+        return texts, total
+    finally:
+        pdf.close()
+
+
+def _pymupdf_pages(data: bytes, start: int, stop: Optional[int]) -> tuple[list[str], int]:
+    with pymupdf.open(stream=data, filetype="pdf") as doc:
+        total = doc.page_count
+        stop = min(total, stop) if stop is not None else total
+        return [doc.load_page(i).get_text() for i in range(start, stop)], total
+
+
+def _pypdf2_pages(data: bytes, start: int, stop: Optional[int]) -> tuple[list[str], int]:
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    total = len(reader.pages)
+    stop = min(total, stop) if stop is not None else total
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)], total
+
+
+_BACKENDS: dict[str, tuple[object, Callable[[bytes, int, Optional[int]], tuple[list[str], int]]]] = {
+    "pdfium": (pypdfium2, _pdfium_pages),
+    "pymupdf": (pymupdf, _pymupdf_pages),
+    "pypdf2": (PyPDF2, _pypdf2_pages),
+}
+
+
+def available_backends() -> list[str]:
+    """Configured backends that are installed, in the order they are tried."""
+    return [name for name in PDF_BACKENDS if name in _BACKENDS and _BACKENDS[name][0] is not None]
+
+
+def extract_pages(
+    data: bytes,
+    start: int = 0,
+    stop: Optional[int] = None,
+    backend: Optional[str] = None,
+) -> tuple[list[str], str, int]:
+    """
+    Text of pages [start, stop) as (page texts, backend used, total pages).
+    With `backend` only that one is tried. Raises the last backend's error
+    if none could read the file.
+    """
+    error: Optional[Exception] = None
+    for name in [backend] if backend else available_backends():
+        try:
+            texts, total = _BACKENDS[name][1](data, start, stop)
+        except Exception as e:
+            error = e
+            continue
+        return texts, name, total
+    raise error or ValueError("No PDF extraction backend is available.")
+
+
+def extract(data: bytes, max_pages: Optional[int] = None) -> PdfText:
+    """Extract a whole document (up to max_pages); pages are joined once, in linear time."""
+    texts, backend, total = extract_pages(data, 0, max_pages)
+    return PdfText("\n".join(texts).strip(), backend, total)
@@ -0,0 +1,120 @@
+import math
+import re
+from collections import Counter
+from typing import Optional
+
+# ── Local Pre-Screen ──────────────────────
+# Ranks resumes against the JD with BM25 over keyword/skill terms so that only
+# the most relevant candidates are sent to the LLM. Everything is computed
+# in-process from token counts, which handles thousands of resumes per second.
+
+# Keeps skill-like tokens intact: c++, c#, node.js, ci/cd, .net
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#./-]*|\.net")
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be been before being below between both
+but by can could did do does doing down during each etc few for from further had has have having he
+her here hers him his how i if in into is it its itself just me more most must my no nor not now of
+off on once only or other our ours out over own per same shall she should so some such than that the
+their theirs them then there these they this those through to too under until up us very via was we
+were what when where which while who whom why will with within without would you your yours
+able ability candidate candidates experience experienced work working team teams role job position
+years year strong good excellent knowledge skills skill required requirements preferred plus including
+responsibilities responsible using use looking join company opportunity etc
+""".split())
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase keyword tokens with trailing punctuation and stopwords removed."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        token = token.rstrip("./-")
+        if len(token) > 1 and token not in STOPWORDS and not token.isdigit():
+            tokens.append(token)
+    return tokens
+
+
+def bm25_scores(docs: list[Counter], doc_lens: list[int], query: Counter) -> list[float]:
+    """BM25 score of every document against the (weighted) query terms."""
+    n = len(docs)
+    if n == 0:
+        return []
+    avgdl = (sum(doc_lens) / n) or 1.0
+
+    idf = {}
+    for term in query:
+        df = sum(1 for doc in docs if term in doc)
+        idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    scores = []
+    for doc, dl in zip(docs, doc_lens):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl)
+        total = 0.0
+        for term, qtf in query.items():
+            tf = doc.get(term)
+            if tf:
+                total += qtf * idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+        scores.append(total)
+    return scores
+
+
+def prescreen(
+    resumes: list[tuple[str, str]],
+    job_description: str,
+    top_k: Optional[int] = None,
+    threshold: Optional[float] = None,
+) -> tuple[list[tuple[str, str]], list[dict]]:
+    """
+    Rank resumes against the JD locally.
+    Returns (selected, filtered): `selected` are the (filename, text) pairs to
+    send to LLM scoring, `filtered` are ready-made results for the rest.
+    A resume is kept if it is within the top_k AND its local score (0-100,
+    relative to the best resume in the batch) is at least `threshold`.
+    """
+    jd_counts = Counter(tokenize(job_description))
+    # Cap repeated JD terms so one keyword can't dominate the ranking
+    query = Counter({term: min(count, 3) for term, count in jd_counts.items()})
+
+    docs = []
+    doc_lens = []
+    for _, text in resumes:
+        tokens = tokenize(text)
+        docs.append(Counter(tokens))
+        doc_lens.append(len(tokens))
+
+    raw = bm25_scores(docs, doc_lens, query)
+    best = max(raw, default=0.0) or 1.0
+    local_scores = [round(100 * s / best) for s in raw]
+
+    ranked = sorted(range(len(resumes)), key=lambda i: raw[i], reverse=True)
+    keep = set(ranked[:top_k] if top_k is not None else ranked)
+    if threshold is not None:
+        keep = {i for i in keep if local_scores[i] >= threshold}
+
+    # JD terms ordered by how often the JD mentions them, for skill lists
+    jd_terms = [term for term, _ in jd_counts.most_common(40)]
+
+    selected = []
+    filtered = []
+    for rank, i in enumerate(ranked, 1):
+        filename, text = resumes[i]
+        if i in keep:
+            selected.append((filename, text))
+            continue
+        matching = [t for t in jd_terms if t in docs[i]][:10]
+        missing = [t for t in jd_terms if t not in docs[i]][:10]
+        filtered.append({
+            "filename": filename,
+            "score": min(local_scores[i], 49),
+            "verdict": "Rejected",
+            "reason": f"Filtered by local pre-screen: ranked {rank} of {len(resumes)} by keyword overlap with the job description.",
+            "matching_skills": matching,
+            "missing_skills": missing,
+            "summary": "Not sent for AI scoring; low keyword relevance to the job description.",
+            "prescreened": True,
+            "local_score": local_scores[i],
+        })
+    return selected, filtered
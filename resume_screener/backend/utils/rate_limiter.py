@@ -0,0 +1,220 @@
+import asyncio
+import contextvars
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# ── Config ────────────────────────────────
+LLM_CONCURRENCY_INITIAL = float(os.getenv("LLM_CONCURRENCY_INITIAL", "16"))
+LLM_CONCURRENCY_MIN = float(os.getenv("LLM_CONCURRENCY_MIN", "2"))
+LLM_CONCURRENCY_MAX = float(os.getenv("LLM_CONCURRENCY_MAX", "200"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+# Calls slower than this are treated as a sign of provider congestion
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "20"))  # seconds
+
+# Who the current LLM call is for, as ("user:<id>", job/session id); set by
+# request handlers / jobs and inherited by every task they spawn, so capacity
+# is shared fairly between users and between each user's jobs.
+limiter_key: contextvars.ContextVar[tuple[str, str]] = contextvars.ContextVar(
+    "limiter_key", default=("anonymous", "")
+)
+
+
+THROTTLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+THROTTLE_STATUS_NAMES = frozenset({"RESOURCE_EXHAUSTED", "UNAVAILABLE"})
+# For errors that only carry a message (e.g. wrapped by LangChain): whole
+# status codes and gRPC status names, never digits inside other numbers or ids
+_THROTTLE_MESSAGE = re.compile(
+    r"\b(?:429|50[0234])\b|\b(?:RESOURCE_EXHAUSTED|UNAVAILABLE)\b"
+    r"|\b(?:Too Many Requests|[Rr]ate limit(?:ed)?|[Oo]verloaded)\b"
+)
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    """True for provider rate-limit (429) and overload (500/502/503/504) errors."""
+    # Typed provider errors: google-genai APIError (.code, .status), OpenAI
+    # APIStatusError (.status_code), httpx HTTPStatusError (.response)
+    response = getattr(exc, "response", None)
+    for code in (
+        getattr(exc, "status_code", None),
+        getattr(exc, "code", None),
+        getattr(response, "status_code", None),
+    ):
+        if isinstance(code, int) and not isinstance(code, bool):
+            return code in THROTTLE_STATUS_CODES
+    status = getattr(exc, "status", None)
+    if isinstance(status, str) and status:
+        return status in THROTTLE_STATUS_NAMES
+    return bool(_THROTTLE_MESSAGE.search(str(exc)))
+
+
+class AdaptiveLimiter:
+    """
+    Process-wide limiter for LLM calls.
+
+    - Concurrency limit adapts by AIMD: +1 per limit's worth of successful
+      calls, halved on 429/5xx, trimmed when latency exceeds the target.
+    - A token bucket enforces the provider's tokens-per-minute budget.
+    - Waiting callers are served round-robin by user, then round-robin
+      across that user's jobs, so one large job can't starve other users
+      or the same user's other jobs.
+    """
+
+    def __init__(
+        self,
+        initial: float = LLM_CONCURRENCY_INITIAL,
+        minimum: float = LLM_CONCURRENCY_MIN,
+        maximum: float = LLM_CONCURRENCY_MAX,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        latency_target: float = LLM_LATENCY_TARGET,
+    ):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        # user -> job -> waiting callers, both levels in rotation order
+        self._waiters: "OrderedDict[str, OrderedDict[str, deque[asyncio.Future]]]" = OrderedDict()
+        self._last_decrease = 0.0
+
+        self.tokens_per_minute = tokens_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._tokens_at = time.monotonic()
+
+        self.calls = 0
+        self.throttled = 0
+        self.slow = 0
+
+    # ── Slots ──
+    async def _acquire(self, key: tuple[str, str]):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        user, job = key
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user, OrderedDict()).setdefault(job, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we were cancelled; pass it on
+                self._release()
+            else:
+                jobs = self._waiters.get(user)
+                queue = jobs.get(job) if jobs is not None else None
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del jobs[job]
+                    if not jobs:
+                        del self._waiters[user]
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        """Hand free slots to waiters, rotating across users, then their jobs."""
+        while self._waiters and self.in_flight < int(self.limit):
+            user, jobs = next(iter(self._waiters.items()))
+            job, queue = next(iter(jobs.items()))
+            future = queue.popleft()
+            if queue:
+                jobs.move_to_end(job)
+            else:
+                del jobs[job]
+            if jobs:
+                self._waiters.move_to_end(user)
+            else:
+                del self._waiters[user]
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    # ── Token budget ──
+    async def _spend_tokens(self, tokens: int):
+        tokens = min(tokens, self.tokens_per_minute)
+        rate = self.tokens_per_minute / 60.0
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._tokens_at) * rate)
+            self._tokens_at = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self._tokens) / rate)
+
+    # ── AIMD ──
+    def _on_success(self, latency: float):
+        if latency > self.latency_target:
+            self.slow += 1
+            self._decrease(0.9)
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+            self._wake()
+
+    def _on_throttle(self):
+        self.throttled += 1
+        self._decrease(0.5)
+
+    def _decrease(self, factor: float):
+        # At most one cut per second so a burst of failures doesn't collapse the limit
+        now = time.monotonic()
+        if now - self._last_decrease >= 1.0:
+            self.limit = max(self.minimum, self.limit * factor)
+            self._last_decrease = now
+
+    async def call(
+        self, fn: Callable[[], Awaitable[T]], tokens: int = 0, key: Optional[tuple[str, str]] = None
+    ) -> T:
+        """
+        Run `fn()` once under the limiter. Rate-limit/overload errors shrink
+        the limit and are re-raised; retrying is left to the caller
+        (utils.resilience) so attempts don't multiply across layers.
+        """
+        key = key or limiter_key.get()
+        await self._acquire(key)
+        try:
+            await self._spend_tokens(tokens)
+            started = time.monotonic()
+            self.calls += 1
+            result = await fn()
+        except Exception as e:
+            if is_throttle_error(e):
+                self._on_throttle()
+            raise
+        else:
+            self._on_success(time.monotonic() - started)
+            return result
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": sum(len(q) for jobs in self._waiters.values() for q in jobs.values()),
+            "waiting_keys": len(self._waiters),
+            "waiting_jobs": sum(len(jobs) for jobs in self._waiters.values()),
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "slow": self.slow,
+            "tokens_available": int(self._tokens),
+            "tokens_per_minute": self.tokens_per_minute,
+        }
+
+
+_limiter: Optional[AdaptiveLimiter] = None
+
+
+def get_limiter() -> AdaptiveLimiter:
+    """Process-wide LLM limiter (all state lives on the event loop thread)."""
+    global _limiter
+    if _limiter is None:
+        _limiter = AdaptiveLimiter()
+    return _limiter
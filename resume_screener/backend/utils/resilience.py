@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from utils.rate_limiter import is_throttle_error
+
+T = TypeVar("T")
+
+# ── Config ────────────────────────────────
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "60"))  # seconds per attempt
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # seconds
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))  # seconds
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+# Don't hedge until there are enough samples for a meaningful p95
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+
+class LLMOutputError(ValueError):
+    """The model's reply could not be parsed as the expected JSON."""
+
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def parse_llm_json(text: str) -> dict:
+    """
+    Parse a JSON object from a model reply, repairing the usual defects:
+    markdown code fences, prose around the object and trailing commas.
+    Raises LLMOutputError if nothing parseable is left.
+    """
+    candidate = _FENCE_RE.sub("", (text or "").strip())
+    start, end = candidate.find("{"), candidate.rfind("}")
+    if start != -1 and end > start:
+        candidate = candidate[start:end + 1]
+    for attempt in (candidate, _TRAILING_COMMA_RE.sub(r"\1", candidate)):
+        try:
+            value = json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value
+    raise LLMOutputError(f"Model returned invalid JSON: {text[:200]!r}")
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 500):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self._samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+latency = LatencyTracker()
+# Why calls were retried or hedged: timeout, throttled, network, parse, hedged
+retry_counters: Counter = Counter()
+
+
+def _retry_reason(exc: BaseException) -> Optional[str]:
+    """Classify a failed attempt; None means it isn't worth retrying."""
+    if isinstance(exc, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(exc, LLMOutputError):
+        return "parse"
+    if is_throttle_error(exc):
+        return "throttled"
+    if isinstance(exc, (ConnectionError, OSError)) or "timed out" in str(exc).lower():
+        return "network"
+    return None
+
+
+async def _hedged(make_call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run make_call(); if it is still running after the current p95 latency,
+    start one duplicate and return whichever succeeds first. The duplicate
+    shares the primary's limiter slot.
+    """
+    started = time.monotonic()
+    primary = asyncio.ensure_future(make_call())
+    hedge_after = latency.percentile(0.95) if LLM_HEDGE else None
+    tasks = {primary}
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                retry_counters["hedged"] += 1
+                tasks.add(asyncio.ensure_future(make_call()))
+
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    latency.record(time.monotonic() - started)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def deadline_call(invoke: Callable[[], Awaitable[T]]) -> T:
+    """
+    One provider call with the per-attempt deadline and a hedged duplicate
+    if it runs slow. Call this inside the limiter slot, so time spent
+    queueing for a slot or tokens counts against neither clock.
+    """
+    return await asyncio.wait_for(_hedged(invoke), timeout=LLM_CALL_DEADLINE)
+
+
+async def resilient_call(make_call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Call make_call() with jittered exponential backoff on transient failures
+    (timeouts, throttling, network errors, unparseable output). This is the
+    only retry layer: the limiter makes one attempt per call.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return await make_call()
+        except Exception as e:
+            reason = _retry_reason(e)
+            if reason is None or attempt == LLM_MAX_RETRIES:
+                raise
+            retry_counters[reason] += 1
+        delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt)
+        await asyncio.sleep(random.uniform(0, delay))  # full jitter
+    raise RuntimeError("unreachable")
+
+
+def stats() -> dict:
+    p50 = latency.percentile(0.5)
+    p95 = latency.percentile(0.95)
+    return {
+        "retries": dict(retry_counters),
+        "latency_p50": round(p50, 3) if p50 is not None else None,
+        "latency_p95": round(p95, 3) if p95 is not None else None,
+    }
@@ -0,0 +1,177 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# ── Config ────────────────────────────────
+# "sqlite" shares results across uvicorn workers (and survives restarts);
+# "memory" keeps them in a bounded per-process LRU.
+RESULTS_STORE_BACKEND = os.getenv("RESULTS_STORE_BACKEND", "sqlite")
+RESULTS_STORE_PATH = os.getenv(
+    "RESULTS_STORE_PATH",
+    str(Path(__file__).resolve().parent.parent / "results_store.db"),
+)
+RESULTS_TTL = int(os.getenv("RESULTS_TTL", str(24 * 3600)))  # seconds
+RESULTS_MAX_BYTES = int(os.getenv("RESULTS_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def _pack(results: list[dict]) -> bytes:
+    """Compact serialization: minified JSON, zlib-compressed."""
+    return zlib.compress(json.dumps(results, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def _unpack(blob: bytes) -> list[dict]:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class MemoryResultsStore:
+    """Per-process LRU of packed results with TTL expiry and a total-size cap."""
+
+    def __init__(self, ttl: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, key: str, results: list[dict]):
+        blob = _pack(results)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (time.time(), blob)
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def get(self, key: str) -> Optional[list[dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                    self._bytes -= len(entry[1])
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _unpack(entry[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class SQLiteResultsStore:
+    """
+    On-disk store shared by every worker on the host. Rows expire after the
+    TTL and the least recently read rows are evicted above `max_bytes`.
+    """
+
+    def __init__(self, path: str, ttl: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " blob BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at)")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, key: str, results: list[dict]):
+        blob = _pack(results)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, blob, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+            self._evict(now)
+
+    def get(self, key: str) -> Optional[list[dict]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blob FROM results WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return _unpack(row[0])
+
+    def _evict(self, now: float):
+        cur = self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+        self.evictions += max(cur.rowcount, 0)
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY accessed_at ASC"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM results WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {
+            "backend": "sqlite",
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_results_store():
+    """Process-wide results store for the configured backend, created lazily."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if RESULTS_STORE_BACKEND == "memory":
+                    _store = MemoryResultsStore(RESULTS_TTL, RESULTS_MAX_BYTES)
+                else:
+                    _store = SQLiteResultsStore(RESULTS_STORE_PATH, RESULTS_TTL, RESULTS_MAX_BYTES)
+    return _store
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# ── Config ────────────────────────────────
+SCORE_CACHE_PATH = os.getenv(
+    "SCORE_CACHE_PATH",
+    str(Path(__file__).resolve().parent.parent / "score_cache.db"),
+)
+SCORE_CACHE_TTL = int(os.getenv("SCORE_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "50000"))
+# Expiry and the size cap are enforced once per this many writes rather than
+# on every write, so the cache can briefly hold up to this many extra rows
+SCORE_CACHE_EVICT_EVERY = int(os.getenv("SCORE_CACHE_EVICT_EVERY", "500"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    """Collapse whitespace so re-extracted copies of the same PDF hash identically."""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def make_key(resume_text: str, job_description: str, model: str, prompt_version: str) -> str:
+    """Content-addressed cache key for one (resume, JD, model, prompt) scoring call."""
+    h = hashlib.sha256()
+    for part in (
+        hashlib.sha256(_normalize(resume_text).encode("utf-8")).hexdigest(),
+        hashlib.sha256(_normalize(job_description).encode("utf-8")).hexdigest(),
+        model,
+        prompt_version,
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ScoreCache:
+    """
+    SQLite-backed cache of LLM scoring results with TTL expiry and
+    least-recently-used eviction once `max_entries` is exceeded. The
+    a-prefixed methods run the same lookups off the event loop.
+    """
+
+    def __init__(self, path: str, ttl: int, max_entries: int, evict_every: int = SCORE_CACHE_EVICT_EVERY):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = max(1, evict_every)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS score_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_score_cache_accessed ON score_cache (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_score_cache_created ON score_cache (created_at)"
+        )
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM score_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM score_cache WHERE key = ?", (key,))
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE score_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict):
+        now = time.time()
+        payload = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO score_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            self.writes += 1
+            if self.writes % self.evict_every == 0:
+                self._evict(now)
+
+    async def aget(self, key: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: dict):
+        await asyncio.to_thread(self.set, key, value)
+
+    def _evict(self, now: float):
+        """Drop expired rows, then the least recently used rows above the size cap."""
+        cur = self._conn.execute("DELETE FROM score_cache WHERE created_at < ?", (now - self.ttl,))
+        self.evictions += max(cur.rowcount, 0)
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM score_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM score_cache WHERE key IN ("
+                " SELECT key FROM score_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM score_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": size,
+            "max_entries": self.max_entries,
+        }
+
+
+_cache: Optional[ScoreCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_score_cache() -> ScoreCache:
+    """Process-wide scoring cache, opened lazily on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ScoreCache(SCORE_CACHE_PATH, SCORE_CACHE_TTL, SCORE_CACHE_MAX_ENTRIES)
+    return _cache
@@ -0,0 +1,335 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import AsyncGenerator, Optional
+
+# ── Config ────────────────────────────────
+SESSION_LOG_PATH = os.getenv(
+    "SESSION_LOG_PATH",
+    str(Path(__file__).resolve().parent.parent / "session_log.db"),
+)
+SESSION_LOG_TTL = int(os.getenv("SESSION_LOG_TTL", str(24 * 3600)))  # seconds
+# Expired sessions are deleted by a periodic purge() (see main.py / worker.py)
+SESSION_PURGE_INTERVAL = float(os.getenv("SESSION_PURGE_INTERVAL", "300"))  # seconds
+# How often a tailing client re-checks the log for events written by another worker
+SESSION_POLL_INTERVAL = float(os.getenv("SESSION_POLL_INTERVAL", "1.0"))
+# Jobs run inside a web worker hold a lease on their session and renew it
+# while they run; if the worker dies the lease lapses and the session is
+# reported as failed instead of being followed forever
+SESSION_LEASE_TTL = float(os.getenv("SESSION_LEASE_TTL", "30"))  # seconds
+SESSION_LEASE_RENEW = SESSION_LEASE_TTL / 3
+LOST_SESSION_MESSAGE = "The job was interrupted before it finished (its server restarted). Reserved credits are refunded."
+
+
+class SessionLog:
+    """
+    Durable, append-only event log per screening session (SQLite).
+    Every SSE event is written here as it is produced, so a client that
+    disconnects can reconnect and replay from any offset. The a-prefixed
+    methods and tail() do their SQLite work off the event loop.
+    """
+
+    def __init__(self, path: str, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # One commit per event: in WAL mode NORMAL skips the fsync on each
+        # commit (a crash can lose the last events, never corrupt the log)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " user_id INTEGER,"
+            " done INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_events ("
+            " session_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, seq))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_leases ("
+            " session_id TEXT PRIMARY KEY,"
+            " expires_at REAL NOT NULL)"
+        )
+        # One event per tailing client in this process, set as soon as an
+        # event is appended, so concurrent tailers never clear each other's wakeup
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+        self._next_seq: dict[str, int] = {}
+
+    def create(self, session_id: str, user_id: Optional[int]):
+        """Register a session; re-creating an existing one (a retried job) reopens it."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, user_id, done, created_at) VALUES (?, ?, 0, ?)"
+                " ON CONFLICT (session_id) DO UPDATE SET done = 0",
+                (session_id, user_id, time.time()),
+            )
+
+    async def acreate(self, session_id: str, user_id: Optional[int]):
+        await asyncio.to_thread(self.create, session_id, user_id)
+
+    def append(self, session_id: str, event: dict) -> int:
+        seq = self._insert(session_id, event)
+        self._notify(session_id)
+        return seq
+
+    async def aappend(self, session_id: str, event: dict) -> int:
+        seq = await asyncio.to_thread(self._insert, session_id, event)
+        self._notify(session_id)
+        return seq
+
+    def _insert(self, session_id: str, event: dict) -> int:
+        with self._lock:
+            seq = self._next_seq.get(session_id)
+            if seq is None:
+                # First append in this process (the session may have been
+                # created by a web worker and be written by a queue worker)
+                (last,) = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM session_events WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                seq = last + 1
+            self._next_seq[session_id] = seq + 1
+            self._conn.execute(
+                "INSERT INTO session_events (session_id, seq, payload) VALUES (?, ?, ?)",
+                (session_id, seq, json.dumps(event)),
+            )
+        return seq
+
+    def finish(self, session_id: str):
+        self._mark_done(session_id)
+        self._notify(session_id, last=True)
+
+    async def afinish(self, session_id: str):
+        await asyncio.to_thread(self._mark_done, session_id)
+        self._notify(session_id, last=True)
+
+    def _mark_done(self, session_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET done = 1 WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM session_leases WHERE session_id = ?", (session_id,))
+            self._next_seq.pop(session_id, None)
+
+    # ── Leases ──
+    def renew_lease(self, session_id: str, ttl: float = SESSION_LEASE_TTL):
+        """Take or extend the running job's lease on its session."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_leases (session_id, expires_at) VALUES (?, ?)",
+                (session_id, time.time() + ttl),
+            )
+
+    def lease_expired(self, session_id: str) -> bool:
+        """True if the session's job held a lease and stopped renewing it without finishing."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM session_leases WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row is not None and row[0] < time.time()
+
+    def expire_lost_sessions(self) -> list[str]:
+        """
+        Finish every unfinished session whose lease has lapsed with a final
+        error event, and return their ids so the caller can clean up after
+        them (e.g. refund credits). Safe to run from several processes: each
+        session is expired exactly once.
+        """
+        expired = []
+        with self._lock:
+            lost = self._conn.execute(
+                "SELECT l.session_id FROM session_leases l JOIN sessions s ON s.session_id = l.session_id"
+                " WHERE l.expires_at < ? AND s.done = 0",
+                (time.time(),),
+            ).fetchall()
+            for (session_id,) in lost:
+                if self._fail_locked(session_id, LOST_SESSION_MESSAGE):
+                    expired.append(session_id)
+        for session_id in expired:
+            self._notify(session_id, last=True)
+        return expired
+
+    def fail(self, session_id: str, message: str) -> bool:
+        """
+        Finish a session that is still running with a final error event
+        (e.g. its credits were reclaimed). Returns False if it had already
+        finished, or doesn't exist.
+        """
+        with self._lock:
+            failed = self._fail_locked(session_id, message)
+        if failed:
+            self._notify(session_id, last=True)
+        return failed
+
+    def _fail_locked(self, session_id: str, message: str) -> bool:
+        # Atomic across processes: only one caller sees done flip from 0 to 1
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = self._conn.execute(
+                "UPDATE sessions SET done = 1 WHERE session_id = ? AND done = 0", (session_id,)
+            )
+            if cur.rowcount:
+                (last,) = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM session_events WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                event = {"type": "error", "message": message, "session_id": session_id}
+                self._conn.execute(
+                    "INSERT INTO session_events (session_id, seq, payload) VALUES (?, ?, ?)",
+                    (session_id, last + 1, json.dumps(event)),
+                )
+            self._conn.execute("DELETE FROM session_leases WHERE session_id = ?", (session_id,))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._next_seq.pop(session_id, None)
+        return bool(cur.rowcount)
+
+    def owner(self, session_id: str) -> Optional[tuple]:
+        """(user_id,) of the session, or None if it doesn't exist or has expired."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id FROM sessions WHERE session_id = ? AND created_at >= ?",
+                (session_id, time.time() - self.ttl),
+            ).fetchone()
+
+    async def aowner(self, session_id: str) -> Optional[tuple]:
+        return await asyncio.to_thread(self.owner, session_id)
+
+    def read(self, session_id: str, since: int) -> tuple[list[tuple[int, str]], bool]:
+        """Events with seq > since, plus whether the session has finished."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, payload FROM session_events WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, since),
+            ).fetchall()
+            done = self._conn.execute(
+                "SELECT done FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return rows, bool(done and done[0])
+
+    async def tail(self, session_id: str, since: int = 0) -> AsyncGenerator[str, None]:
+        """Replay events after `since` as SSE frames, then follow live until the session finishes."""
+        waiter = asyncio.Event()
+        self._waiters.setdefault(session_id, set()).add(waiter)
+        try:
+            while True:
+                # Cleared before reading, so an append during the read still wakes us
+                waiter.clear()
+                rows, done = await asyncio.to_thread(self.read, session_id, since)
+                for seq, payload in rows:
+                    since = seq
+                    yield f"id: {seq}\ndata: {payload}\n\n"
+                if done and not rows:
+                    return
+                if not rows and await asyncio.to_thread(self.lease_expired, session_id):
+                    # The job's web worker died; expire_lost_sessions will
+                    # record this, but don't keep the client waiting for it
+                    event = {"type": "error", "message": LOST_SESSION_MESSAGE, "session_id": session_id}
+                    yield f"data: {json.dumps(event)}\n\n"
+                    return
+                if not rows:
+                    try:
+                        await asyncio.wait_for(waiter.wait(), timeout=SESSION_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            waiters = self._waiters.get(session_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[session_id]
+
+    def _notify(self, session_id: str, last: bool = False):
+        # Tailers still waiting when the session finishes wake up, read the
+        # final events and exit; none of them needs the entry after that
+        waiters = self._waiters.pop(session_id, None) if last else self._waiters.get(session_id)
+        for waiter in waiters or ():
+            waiter.set()
+
+    def purge(self) -> int:
+        """Delete sessions older than the TTL; run periodically off the event loop."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                row[0] for row in self._conn.execute(
+                    "SELECT session_id FROM sessions WHERE created_at < ?", (cutoff,)
+                )
+            ]
+            for session_id in expired:
+                self._conn.execute("DELETE FROM session_events WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM session_leases WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return len(expired)
+
+
+_log: Optional[SessionLog] = None
+_log_lock = threading.Lock()
+# Strong references so running jobs aren't garbage-collected mid-flight
+_running_jobs: set[asyncio.Task] = set()
+
+
+def get_session_log() -> SessionLog:
+    """Process-wide session log, opened lazily on first use."""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = SessionLog(SESSION_LOG_PATH, SESSION_LOG_TTL)
+    return _log
+
+
+async def run_session_events(session_id: str, events: AsyncGenerator[dict, None]) -> Optional[str]:
+    """
+    Drain a session's event generator into the session log, then mark the
+    session finished. Returns the error message if the generator failed.
+    """
+    log = get_session_log()
+    try:
+        async for event in events:
+            await log.aappend(session_id, event)
+    except Exception as e:
+        await log.aappend(session_id, {"type": "error", "message": str(e), "session_id": session_id})
+        return str(e)
+    finally:
+        await log.afinish(session_id)
+    return None
+
+
+async def _run_leased(session_id: str, events: AsyncGenerator[dict, None]) -> Optional[str]:
+    log = get_session_log()
+
+    async def _renew():
+        while True:
+            await asyncio.sleep(SESSION_LEASE_RENEW)
+            await asyncio.to_thread(log.renew_lease, session_id)
+
+    renewer = asyncio.create_task(_renew())
+    try:
+        return await run_session_events(session_id, events)
+    finally:
+        renewer.cancel()
+
+
+async def start_session_job(
+    session_id: str, user_id: Optional[int], events: AsyncGenerator[dict, None]
+) -> asyncio.Task:
+    """
+    Run a session's event generator as a background task, independent of any
+    HTTP connection, persisting every event to the session log as it arrives.
+    The task holds a lease on the session for as long as it runs.
+    """
+    log = get_session_log()
+    await log.acreate(session_id, user_id)
+    await asyncio.to_thread(log.renew_lease, session_id)
+    task = asyncio.create_task(_run_leased(session_id, events))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+    return task
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from utils.pdf_engine import PdfText
+
+# ── Config ────────────────────────────────
+TEXT_CACHE_PATH = os.getenv(
+    "TEXT_CACHE_PATH",
+    str(Path(__file__).resolve().parent.parent / "text_cache.db"),
+)
+TEXT_CACHE_TTL = int(os.getenv("TEXT_CACHE_TTL", str(30 * 24 * 3600)))  # seconds
+TEXT_CACHE_MAX_ENTRIES = int(os.getenv("TEXT_CACHE_MAX_ENTRIES", "200000"))
+# Expiry and the size cap are enforced once per this many writes (per
+# process) rather than on every write, like the score cache
+TEXT_CACHE_EVICT_EVERY = int(os.getenv("TEXT_CACHE_EVICT_EVERY", "500"))
+# Per process: the parsing pool workers each keep their own memory tier
+TEXT_CACHE_MEMORY_BYTES = int(os.getenv("TEXT_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+
+
+def make_text_key(pdf_bytes: bytes, max_pages: Optional[int]) -> str:
+    """Content-addressed key for the text of one PDF extracted up to `max_pages`."""
+    return f"{hashlib.sha256(pdf_bytes).hexdigest()}:{max_pages}"
+
+
+class TextCache:
+    """
+    Extracted PDF text keyed by content hash: an in-memory LRU (bounded by
+    text size) in front of a SQLite store with TTL expiry and
+    least-recently-used eviction once `max_entries` is exceeded.
+    """
+
+    def __init__(
+        self, path: str, ttl: int, max_entries: int, memory_bytes: int, evict_every: int = TEXT_CACHE_EVICT_EVERY
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = max(1, evict_every)
+        self.memory_bytes = memory_bytes
+        self._memory: "OrderedDict[str, PdfText]" = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")  # shared with the parsing pool processes
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS text_cache ("
+            " key TEXT PRIMARY KEY,"
+            " text BLOB NOT NULL,"
+            " backend TEXT NOT NULL,"
+            " pages INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_text_cache_accessed ON text_cache (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_text_cache_created ON text_cache (created_at)"
+        )
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.bytes_saved = 0  # PDF bytes that didn't have to be parsed
+
+    def _remember(self, key: str, value: PdfText):
+        size = len(value.text)
+        if size > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= len(old.text)
+        self._memory[key] = value
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_used -= len(dropped.text)
+
+    def get(self, key: str, pdf_size: int = 0) -> Optional[PdfText]:
+        now = time.time()
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.bytes_saved += pdf_size
+                return value
+
+            row = self._conn.execute(
+                "SELECT text, backend, pages, created_at FROM text_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[3] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM text_cache WHERE key = ?", (key,))
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE text_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            value = PdfText(zlib.decompress(row[0]).decode("utf-8"), row[1], row[2])
+            self._remember(key, value)
+            self.disk_hits += 1
+            self.bytes_saved += pdf_size
+        return value
+
+    def set(self, key: str, value: PdfText):
+        now = time.time()
+        payload = zlib.compress(value.text.encode("utf-8"))
+        with self._lock:
+            self._remember(key, value)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO text_cache (key, text, backend, pages, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, value.backend, value.pages, now, now),
+            )
+            self.writes += 1
+            if self.writes % self.evict_every == 0:
+                self._evict(now)
+
+    def record_remote(self, hit: bool, pdf_size: int = 0):
+        """Count a lookup done by a parsing pool worker against its own instance."""
+        with self._lock:
+            if hit:
+                self.disk_hits += 1
+                self.bytes_saved += pdf_size
+            else:
+                self.misses += 1
+
+    def _evict(self, now: float):
+        """Drop expired rows, then the least recently used rows above the size cap."""
+        cur = self._conn.execute("DELETE FROM text_cache WHERE created_at < ?", (now - self.ttl,))
+        self.evictions += max(cur.rowcount, 0)
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM text_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM text_cache WHERE key IN ("
+                " SELECT key FROM text_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM text_cache").fetchone()
+            memory_entries = len(self._memory)
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "memory_entries": memory_entries,
+            "memory_bytes": self._memory_used,
+        }
+
+
+_cache: Optional[TextCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> TextCache:
+    """
+    Process-wide text cache, opened lazily on first use. Forked parsing pool
+    workers open their own (a SQLite connection can't cross a fork).
+    """
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache is None or _cache_pid != os.getpid():
+                _cache = TextCache(TEXT_CACHE_PATH, TEXT_CACHE_TTL, TEXT_CACHE_MAX_ENTRIES, TEXT_CACHE_MEMORY_BYTES)
+                _cache_pid = os.getpid()
+    return _cache
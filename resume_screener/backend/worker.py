@@ -0,0 +1,168 @@
+"""
+Bulk screening queue worker.
+
+Drains the persistent job queue (utils/job_queue.py) filled by POST /jobs/bulk,
+so scoring capacity scales independently of the web workers and survives
+web deploys. Run alongside the API:
+
+    python worker.py --processes 4 --jobs-per-process 2
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from auth import release_credits
+from database import session_scope
+from jobs import remove_files, run_bulk_job
+from utils.compaction import warm_encoding
+from utils.job_queue import get_job_queue
+from utils.session_log import SESSION_PURGE_INTERVAL, get_session_log, run_session_events
+
+logger = logging.getLogger("worker")
+
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # seconds
+HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "15"))  # seconds
+
+
+async def _heartbeat(job_id: str):
+    queue = get_job_queue()
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        await asyncio.to_thread(queue.heartbeat, job_id)
+
+
+async def run_job(job: dict):
+    """Run one claimed job, streaming its events into the session log."""
+    queue = get_job_queue()
+    job_id = job["id"]
+    payload = job["payload"]
+
+    if job["kind"] != "bulk":
+        await asyncio.to_thread(queue.fail, job_id, f"Unknown job kind: {job['kind']}")
+        return
+
+    log = get_session_log()
+    await log.acreate(job_id, job["user_id"])
+    if job["attempts"] > 1:
+        # Tell connected clients the job restarted after a worker was lost
+        await log.aappend(job_id, {"type": "restart", "attempt": job["attempts"], "session_id": job_id})
+
+    events = run_bulk_job(
+        job_id,
+        job["user_id"],
+        payload["job_description"],
+        [tuple(pair) for pair in payload["pdf_uploads"]],
+        payload["zip_paths"],
+        payload["estimated_total"],
+        bypass_cache=payload.get("bypass_cache", False),
+        batch_mode=payload.get("batch_mode", False),
+        prescreen_top_k=payload.get("prescreen_top_k"),
+        prescreen_threshold=payload.get("prescreen_threshold"),
+        provider=payload.get("provider"),
+        token_budget=payload.get("token_budget"),
+        dedup=payload.get("dedup", True),
+        dedup_near=payload.get("dedup_near", False),
+        reservation_id=payload.get("reservation_id"),
+    )
+
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        error = await run_session_events(job_id, events)
+    finally:
+        heartbeat.cancel()
+
+    if error:
+        logger.error(f"Job {job_id} failed: {error}")
+        await asyncio.to_thread(queue.fail, job_id, error)
+    else:
+        await asyncio.to_thread(queue.complete, job_id)
+
+
+def abandon_job(job: dict):
+    """
+    Clean up after a job that lost its worker too many times: refund its
+    reserved credits, delete its spooled uploads and close its session.
+    """
+    payload = job["payload"]
+    if payload.get("reservation_id"):
+        with session_scope() as db:
+            release_credits(db, payload["reservation_id"])
+    remove_files(payload.get("zip_paths", []) + [
+        content for _, content in payload.get("pdf_uploads", []) if isinstance(content, str)
+    ])
+    log = get_session_log()
+    log.append(job["id"], {"type": "error", "message": "Job failed: worker lost too many times", "session_id": job["id"]})
+    log.finish(job["id"])
+
+
+async def worker_loop(worker_id: str, jobs_per_process: int):
+    """Claim and run up to `jobs_per_process` jobs concurrently, forever."""
+    queue = get_job_queue()
+    running: set[asyncio.Task] = set()
+    logger.info(f"Worker {worker_id} started")
+    last_purge = 0.0
+
+    while True:
+        if time.monotonic() - last_purge >= SESSION_PURGE_INTERVAL:
+            last_purge = time.monotonic()
+            await asyncio.to_thread(get_session_log().purge)
+
+        requeued, abandoned = await asyncio.to_thread(queue.requeue_stale)
+        if requeued:
+            logger.warning(f"Requeued {requeued} job(s) from lost workers")
+        for job in abandoned:
+            logger.error(f"Job {job['id']} failed after {job['attempts']} attempts; releasing it")
+            try:
+                await asyncio.to_thread(abandon_job, job)
+            except Exception as e:
+                logger.error(f"Cleanup of job {job['id']} failed: {e}")
+
+        while len(running) < jobs_per_process:
+            job = await asyncio.to_thread(queue.claim, worker_id)
+            if job is None:
+                break
+            logger.info(f"Worker {worker_id} claimed job {job['id']} (attempt {job['attempts']})")
+            running.add(asyncio.create_task(run_job(job)))
+
+        if running:
+            done, running = await asyncio.wait(running, timeout=POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception():
+                    logger.error(f"Worker {worker_id} job crashed: {task.exception()}")
+        else:
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+def _process_main(index: int, jobs_per_process: int):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    # Load the tokenizer before claiming jobs rather than inside the first one
+    warm_encoding()
+    asyncio.run(worker_loop(worker_id, jobs_per_process))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run bulk screening queue workers.")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("JOB_WORKER_PROCESSES", "2")))
+    parser.add_argument("--jobs-per-process", type=int, default=int(os.getenv("JOB_WORKER_CONCURRENCY", "2")))
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _process_main(0, args.jobs_per_process)
+    else:
+        procs = [
+            multiprocessing.Process(target=_process_main, args=(i, args.jobs_per_process), daemon=False)
+            for i in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
@@ -259,6 +259,8 @@ const App = () => {
 
               if (data.type === 'start') {
                 setBulkProgress({ total: data.total, processed: 0 });
+              } else if (data.type === 'total') {
+                setBulkProgress(prev => ({ ...prev, total: data.total }));
               } else if (data.type === 'result') {
                 setBulkResults(prev => [...prev, data]);
                 setBulkProgress(prev => ({ ...prev, processed: data.index }));